@@ -0,0 +1,167 @@
+import contextvars
+import threading
+from collections import OrderedDict
+
+from flask import g, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import load_only
+
+from models import db, Counter
+
+# Query string arguments carrying the keyset cursor
+CURSOR_ARGS = ('after', 'before')
+# Statements a list page may issue: the logged-in user, the data version and the rows
+LIST_QUERY_BUDGET = 3
+
+
+class CountCache:
+    """
+    Row counts of admin lists per (view, search, filters), kept until the data
+    version changes. Every Service/Entity write bumps the version, so cached
+    counts are exact.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        count = compute()
+        with self._lock:
+            self._entries[key] = (version, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return count
+
+
+count_cache = CountCache()
+
+
+class KeysetListMixin:
+    """
+    Flask-Admin list view paged by primary key instead of OFFSET: in the
+    default order each page continues from the last id of the previous one
+    (`?after=<id>`, or `?before=<id>` going back), so deep pages cost the same
+    as the first. Pages sorted by a column, and search results (in the
+    search's own order), fall back to Flask-Admin's numbered pages. Only the listed columns are loaded, and the total comes from
+    `count_cache` instead of a COUNT(*) per page.
+    """
+    list_template = 'admin/keyset_list.html'
+    # The count query is issued (and cached) by get_list, not by Flask-Admin
+    simple_list_pager = True
+
+    def _get_list_extra_args(self):
+        # Sorting, searching and filtering start again from the first page
+        view_args = super()._get_list_extra_args()
+        for name in CURSOR_ARGS:
+            view_args.extra_args.pop(name, None)
+        return view_args
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        # Exports and actions read through get_list too; only the list page is paged by cursor
+        if request.endpoint != f'{self.endpoint}.index_view' or not execute:
+            return super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+
+        count = self.cached_count(search, filters)
+        if sort_column is not None or search:
+            _, query = super().get_list(page, sort_column, sort_desc, search, filters, False, page_size)
+            return count, self._load_listed(query).all()
+
+        _, query = super().get_list(0, None, False, search, filters, execute=False, page_size=False)
+        query = self._load_listed(query).order_by(None)
+        pk = inspect(self.model).primary_key[0]
+        limit = page_size or self.page_size
+        after, before = (request.args.get(name, type=int) for name in CURSOR_ARGS)
+        # One row past the page tells whether there is another page in the direction of travel
+        if before is not None:
+            rows = query.filter(pk < before).order_by(pk.desc()).limit(limit + 1).all()
+            g.keyset_more, rows = len(rows) > limit, rows[:limit][::-1]
+        else:
+            if after is not None:
+                query = query.filter(pk > after)
+            rows = query.order_by(pk).limit(limit + 1).all()
+            g.keyset_more, rows = len(rows) > limit, rows[:limit]
+        return count, rows
+
+    def _load_listed(self, query):
+        """Load only the primary key and the listed columns of the model."""
+        columns = inspect(self.model).column_attrs
+        listed = [columns[name].class_attribute for name in (self.column_list or ()) if name in columns]
+        return query.options(load_only(*listed)) if listed else query
+
+    def cached_count(self, search, filters):
+        def compute():
+            query, count_query, joins, count_joins = self.get_query(), self.get_count_query(), {}, {}
+            if self._search_supported and search:
+                query, count_query, joins, count_joins = self._apply_search(query, count_query, joins,
+                                                                            count_joins, search)
+            if filters and self._filters:
+                query, count_query, joins, count_joins = self._apply_filters(query, count_query, joins,
+                                                                             count_joins, filters)
+            return count_query.scalar()
+
+        return count_cache.get(repr((self.endpoint, search, filters)), Counter.get('data'), compute)
+
+    def _cursor_url(self, **cursor):
+        args = {k: v for k, v in request.args.items() if k not in CURSOR_ARGS + ('page',)}
+        return self.get_url('.index_view', **args, **cursor)
+
+    def keyset_pager(self, data):
+        """URLs of the first, previous and next pages around `data`; None where there is none."""
+        after, before = (request.args.get(name, type=int) for name in CURSOR_ARGS)
+        more = g.get('keyset_more', False)
+        pk = inspect(self.model).primary_key[0].key
+        first = self._cursor_url() if after is not None or before is not None else None
+        previous = next_ = None
+        if data and (after is not None or (before is not None and more)):
+            previous = self._cursor_url(before=getattr(data[0], pk))
+        if data and (before is not None or more):
+            next_ = self._cursor_url(after=getattr(data[-1], pk))
+        return first, previous, next_
+
+
+def check_list_queries(app, user, views):
+    """
+    Count the SQL statements each admin list view issues for its first page,
+    a page from the middle of the list and a column-sorted page, as `user`.
+    Returns a list of (view endpoint, {page: statements}).
+    """
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+    results = []
+    for view in views:
+        pk = inspect(view.model).primary_key[0]
+        total = db.session.scalar(select(db.func.count()).select_from(view.model))
+        middle = db.session.scalar(select(pk).order_by(pk).offset(total // 2).limit(1))
+        pages = {'first': '', 'middle': f'?after={middle or 0}', 'sorted': '?sort=0'}
+        counts = {}
+        for name, query_string in pages.items():
+            url = f'{view.url}/{query_string}'
+            # An empty context, so each request gets its own app context, session and user
+            contextvars.Context().run(client.get, url)  # warm the count cache
+            statements.clear()
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                response = contextvars.Context().run(client.get, url)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} answered {response.status_code}")
+            counts[name] = len(statements)
+        results.append((view.endpoint, counts))
+    return results
@@ -1,33 +1,95 @@
 from flask import Flask
-from models import db, User, Entity, Service
-from utils import generate_signed_url
-from forms import ServiceForm
+from models import db, User, Entity, Service, ServiceOption, LinkRegenerationRun, ExportJob, ServiceStat, Counter
+from utils import token_cache
+from database import database_url, engine_options, configure_sqlite
+from forms import ServiceForm, validation_rules, submission_stats, INTERACTION_CATEGORIES, SUPPORT_CHANNELS, ACCESS_MODES, GEOGRAPHIC_REACH, HOSTING_LOCATIONS
+from exports import csv_response, delta_csv_response, export_query, selected_queries
+from jobs import request_export, recent_exports
+from query_plans import check_query_plans
+from submissions import INSERT_ATTEMPTS, SubmissionQueue, find_duplicate_services
+from fragments import render_service_form
+from conditional import strong_etag, is_fresh, not_modified, with_etag
+from compression import compress_response
+from search import SEARCH_COLUMNS, include_name, matching_services, rebuild_search_index, snippets, words
+from similarity import KINDS, THRESHOLD, find_similar, near_duplicate_clusters, rebuild_similarity_index
+from admin_lists import KeysetListMixin, check_list_queries, LIST_QUERY_BUDGET
+from metrics import metrics, instrument, QUERY_BUDGET
+from assets import asset_url, build_assets, built_dir, fetch_vendor, send_asset
+from batch import BATCH_LIMIT, submit_services, summarize, read_upload, template_csv, template_xlsx
+from bulk import import_entities, start_link_regeneration, regenerate_links, regenerate_links_in_background, unfinished_run, EXPIRING_WITHIN
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 
-from flask import render_template, redirect, url_for, request, flash, Response
-from flask_admin import Admin
+from flask import render_template, redirect, url_for, request, flash, Response, jsonify, send_file, abort, make_response, g
+from flask_wtf.csrf import generate_csrf
+from flask_admin import Admin, AdminIndexView, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.actions import action
+from flask_admin.contrib.sqla.filters import BaseSQLAFilter, FilterEqual
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from flask_migrate import Migrate
+from wtforms.validators import ValidationError
 
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.exceptions import NotFound
+from markupsafe import Markup
 import click
 import os
-import csv
-import io
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///services.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+# Queue submissions to a local log and insert them in batches (see submissions.py)
+app.config['SUBMISSION_QUEUE'] = os.getenv('SUBMISSION_QUEUE', '').lower() in ('1', 'true', 'yes')
+# Requests issuing more SQL statements than this are logged as likely N+1 loops (0 disables)
+app.config['QUERY_BUDGET'] = int(os.getenv('QUERY_BUDGET', QUERY_BUDGET))
+# Endpoints whose normal cost differs from the default, measured with headroom. An accepted
+# service form issues 11 statements; batch endpoints insert one row per service (SQLite can't
+# batch ORM inserts that return ids) plus about a dozen statements per request.
+app.config['QUERY_BUDGETS'] = {'add_service': 15, 'add_services_batch': BATCH_LIMIT + 20,
+                               'upload_services': BATCH_LIMIT + 20}
+# Fraction of requests profiled with cProfile into instance/profiles (0 disables)
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
 
 db.init_app(app)
-
 with app.app_context():
-    db.create_all()
+    configure_sqlite(db.engine)
+    # Per-endpoint latency and SQL counts, served at /admin/metrics
+    instrument(app, db.engine)
+# Schema changes are applied with `flask db upgrade`, never at startup
+migrate = Migrate(app, db, render_as_batch=True, include_name=include_name)
+# gzip/brotli for HTML, JSON and CSV responses
+app.after_request(compress_response)
+# Templates link vendored CSS/JS through the build manifest
+app.add_template_global(asset_url)
+
+submission_queue = None
+if app.config['SUBMISSION_QUEUE']:
+    submission_queue = SubmissionQueue(os.path.join(app.instance_path, 'submission_queue'))
+    submission_queue.start_flusher(app)
+
+metrics.collect('gsa_token_cache_hits_total', 'Signed token cache hits.',
+                lambda: token_cache.stats()['hits'], kind='counter')
+metrics.collect('gsa_token_cache_misses_total', 'Signed token cache misses.',
+                lambda: token_cache.stats()['misses'], kind='counter')
+metrics.collect('gsa_token_cache_size', 'Signed tokens cached.', lambda: token_cache.stats()['size'])
+metrics.collect('gsa_submission_posts_total', 'Service form POSTs.',
+                lambda: submission_stats.stats()['posts'], kind='counter')
+metrics.collect('gsa_submission_accepted_total', 'Service form POSTs that were accepted.',
+                lambda: submission_stats.stats()['accepted'], kind='counter')
+if submission_queue:
+    metrics.collect('gsa_submission_queue_depth', 'Queued submissions not yet inserted.',
+                    lambda: submission_queue.stats()['depth'])
+    metrics.collect('gsa_submission_queue_lag_seconds', 'Age of the oldest queued submission.',
+                    lambda: submission_queue.stats()['lag_seconds'])
+    metrics.collect('gsa_submission_queue_dead_letters', 'Queued submissions set aside because they could not be inserted.',
+                    lambda: submission_queue.stats()['dead_letters'])
 
 
 @app.cli.command('create_admin')
@@ -46,6 +108,144 @@ def create_admin(username, email, password):
         db.session.commit()
         print(f"Admin user {username} created successfully.")
 
+@app.cli.command('import-entities')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--output', '-o', type=click.File('w'), default='entity_links.csv', show_default=True,
+              help='Where to write the link sheet.')
+@click.option('--batch-size', default=500, show_default=True, help='Entities per transaction.')
+@click.option('--regenerate-links', is_flag=True, help='Re-sign links for entities that already have one.')
+@click.option('--base-url', default='', help='Prefix for links in the sheet, e.g. https://gsa.example.org')
+def import_entities_command(source, output, batch_size, regenerate_links, base_url):
+    """Creates or updates entities from a CSV file and writes their service links.
+
+    The file needs a `name` column and may have category, sector, contact_name,
+    contact_position, contact_phone and contact_email columns.
+    """
+    try:
+        stats = import_entities(source, output, batch_size=batch_size,
+                                regenerate_links=regenerate_links, base_url=base_url.rstrip('/'))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"Imported {stats['rows']} rows in {stats['seconds']:.2f}s ({rate:.0f} rows/sec): "
+          f"{stats['created']} created, {stats['updated']} updated, {stats['skipped']} skipped, "
+          f"{stats['signed']} links signed.")
+    print(f"Link sheet written to {output.name}")
+
+@app.cli.command('regenerate-links')
+@click.option('--expiring-within', type=float, default=None,
+              help='Only re-sign links expiring within this many hours (default: all links).')
+@click.option('--chunk-size', default=200, show_default=True, help='Entities per transaction.')
+def regenerate_links_command(expiring_within, chunk_size):
+    """Re-signs service links in chunks, resuming an interrupted run if there is one."""
+    if expiring_within is None:
+        run = start_link_regeneration('all')
+    else:
+        run = start_link_regeneration('expiring', timedelta(hours=expiring_within))
+    print(f"Run {run.id} ({run.scope}): {run.done}/{run.total} entities done")
+
+    def progress(run):
+        print(f"  {run.done}/{run.total}")
+
+    run = regenerate_links(run, chunk_size=chunk_size, progress=progress)
+    print(f"Run {run.id} finished: {run.done} links regenerated.")
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries():
+    """Rebuilds the dashboard summary tables from the services table."""
+    total = ServiceStat.rebuild()
+    print(f"Rebuilt summaries for {total} services.")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fails if a hot query falls back to a full table scan (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException("Query plan checks are only implemented for SQLite.")
+    failed = False
+    for name, plan, scans in check_query_plans():
+        status = f"FULL SCAN of {', '.join(scans)}" if scans else "ok"
+        failed = failed or bool(scans)
+        print(f"{name}: {status}")
+        for line in plan:
+            print(f"    {line}")
+    if failed:
+        raise click.ClickException("Some hot queries do full table scans.")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreates the services full-text index and its triggers, and reindexes every service (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException("The full-text index is SQLite only; other databases search with LIKE.")
+    print(f"Indexed {rebuild_search_index()} services.")
+
+@app.cli.command('check-list-queries')
+def check_list_queries_command():
+    """Fails if an admin list page issues more than LIST_QUERY_BUDGET queries, however deep it is."""
+    user = User.query.first()
+    if user is None:
+        raise click.ClickException("Create an admin user first (flask create_admin).")
+    failed = False
+    for endpoint, counts in check_list_queries(app, user, [entity_view, service_view]):
+        over = max(counts.values()) > LIST_QUERY_BUDGET
+        failed = failed or over
+        pages = ', '.join(f'{page} page {count}' for page, count in counts.items())
+        print(f"{endpoint}: {'OVER BUDGET' if over else 'ok'} ({pages})")
+    if failed:
+        raise click.ClickException(f"Some list pages issue more than {LIST_QUERY_BUDGET} queries.")
+
+@app.cli.command('flush-submissions')
+def flush_submissions():
+    """Inserts every queued submission now (e.g. after a crash or before maintenance)."""
+    queue = submission_queue or SubmissionQueue(os.path.join(app.instance_path, 'submission_queue'))
+    inserted = queue.flush()
+    if inserted is None:
+        raise click.ClickException("Another process is flushing the queue; try again shortly.")
+    print(f"Inserted {inserted} queued submissions.")
+
+@app.cli.command('build-assets')
+@click.option('--fetch', is_flag=True, help='Download the pinned upstream files into static/vendor first.')
+def build_assets_command(fetch):
+    """Builds the fingerprinted CSS/JS/fonts in static/dist from static/vendor."""
+    vendor = os.path.join(app.static_folder, 'vendor')
+    if fetch:
+        for name in fetch_vendor(vendor):
+            print(f"Fetched {name}")
+    built = build_assets(vendor, built_dir(), [os.path.join(app.root_path, app.template_folder)])
+    for name, filename in sorted(built.items()):
+        print(f"{name} -> {filename}")
+
+@app.cli.command('report-duplicates')
+def report_duplicates():
+    """Lists services submitted more than once with identical answers, per entity."""
+    groups = find_duplicate_services()
+    for entity_id, entity_name, service_ids in groups:
+        print(f"{entity_name} (#{entity_id}): services {', '.join(map(str, service_ids))}")
+    print(f"{len(groups)} groups, {sum(len(ids) - 1 for _, _, ids in groups)} redundant services.")
+
+@app.cli.command('rebuild-similarity-index')
+def rebuild_similarity_index_command():
+    """Recomputes the near-duplicate signatures of every service and entity name."""
+    for kind, count in rebuild_similarity_index().items():
+        print(f"Indexed {count} {kind} records.")
+
+@app.cli.command('report-near-duplicates')
+@click.option('--kind', type=click.Choice(list(KINDS)), default='service', show_default=True)
+@click.option('--threshold', type=click.FloatRange(0.3, 1.0), default=THRESHOLD, show_default=True,
+              help='Lowest estimated similarity of a near-duplicate.')
+@click.option('--check', 'text', help='List the indexed records similar to this text instead.')
+def report_near_duplicates(kind, threshold, text):
+    """Lists groups of services (or entity names) with nearly the same text."""
+    if text:
+        for score, record_id, label in find_similar(kind, text, threshold):
+            print(f"{score:.0%}  #{record_id} {label}")
+        return
+    clusters = near_duplicate_clusters(kind, threshold)
+    for score, members in clusters:
+        print(f"{len(members)} {kind} records, {score:.0%}+ similar:")
+        for record_id, label in members:
+            print(f"    #{record_id} {label}")
+    print(f"{len(clusters)} groups, {sum(len(members) - 1 for _, members in clusters)} possible duplicates.")
+
 # Initialize login manager
 login_manager = LoginManager(app)
 
@@ -62,120 +262,195 @@ class AdminModelView(ModelView):
         return current_user.is_authenticated
     
 
-class ServiceModelView(ModelView):
-    # Configure list view
-    list_template = 'admin/model/list.html'
+class ServiceOptionFilter(BaseSQLAFilter):
+    """Filter services by one choice of a multi-select field, using the service_options index."""
+    def __init__(self, field, name, options):
+        super(ServiceOptionFilter, self).__init__(Service.id, name, options=options)
+        self.field = field
+
+    def apply(self, query, value, alias=None):
+        matching = select(ServiceOption.service_id).where(ServiceOption.field == self.field,
+                                                          ServiceOption.value == value)
+        return query.filter(Service.id.in_(matching))
+
+    def operation(self):
+        return 'includes'
+
+
+class ServiceModelView(KeysetListMixin, ModelView):
+    # Configure list view: a few narrow columns, with the entity joined into the page query
+    column_list = ['entity', 'service_name', 'interaction_category', 'access_mode', 'geographic_reach',
+                   'supported_by_it_system', 'users_total']
+    column_select_related_list = [Service.entity]
+    column_formatters = {
+        'entity': lambda view, context, model, name: model.entity.name,
+        'service_name': lambda view, context, model, name: view.service_name_with_snippet(model),
+    }
+    # Searched through the full-text index (see search.py), best matches first
+    column_searchable_list = list(SEARCH_COLUMNS)
+    # Exports stream the EXPORT_COLUMNS format with entity data, whatever their size (see _export_csv)
     can_export = True
-    export_max_rows = 1000
+    form_excluded_columns = ['options', 'submission_key', 'created_at', 'updated_at']
+    # Entities are looked up as the admin types instead of listing every one in a <select>
+    form_ajax_refs = {'entity': {'fields': ['name'], 'page_size': 20}}
+    column_filters = [
+        ServiceOptionFilter('interaction_category', 'Interaction Category', INTERACTION_CATEGORIES),
+        ServiceOptionFilter('support_available_via', 'Support Available Via', SUPPORT_CHANNELS),
+        # Equality (not the default LIKE) filters so the column indexes are used
+        FilterEqual(Service.access_mode, 'Access Mode', options=ACCESS_MODES),
+        FilterEqual(Service.geographic_reach, 'Geographic Reach', options=GEOGRAPHIC_REACH),
+        FilterEqual(Service.hosting_location, 'Hosting Location', options=HOSTING_LOCATIONS),
+        'supported_by_it_system',
+    ]
     
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        if not words(search):
+            return query, count_query, joins, count_joins
+        matches = matching_services(search)
+        query = query.join(matches, matches.c.id == Service.id)
+        # Handed on to _apply_sorting, which orders by rank unless a column sort was picked
+        joins['search_matches'] = matches
+        if count_query is not None:
+            count_query = count_query.filter(Service.id.in_(select(matches.c.id)))
+        return query, count_query, joins, count_joins
+
+    def _apply_sorting(self, query, joins, sort_column, sort_desc):
+        matches = joins.get('search_matches')
+        if matches is None:
+            return super()._apply_sorting(query, joins, sort_column, sort_desc)
+        if sort_column is None:
+            return query.order_by(matches.c.rank, Service.id), joins
+        # A column sort the admin picked comes first; relevance breaks its ties
+        query, joins = super()._apply_sorting(query, joins, sort_column, sort_desc)
+        return query.order_by(matches.c.rank), joins
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        count, data = super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+        if execute and search and request.endpoint == f'{self.endpoint}.index_view':
+            g.search_snippets = snippets(search, [service.id for service in data])
+        return count, data
+
+    def service_name_with_snippet(self, service):
+        """The service name, followed on search pages by where the search words matched"""
+        snippet = g.get('search_snippets', {}).get(service.id)
+        if not snippet:
+            return service.service_name
+        return Markup('{}<br><small class="text-muted">{}</small>').format(service.service_name, snippet)
+
+    def _export_csv(self, return_url):
+        # Flask-Admin's export would build its own column format in memory
+        return self.export_matching()
+
+    @expose('/export_matching/')
+    def export_matching(self):
+        """Stream every service matching the list's current search and filters, with entity data"""
+        etag = strong_etag('admin-export-matching', Counter.get('data'), request.query_string.decode())
+        if is_fresh(etag):
+            return not_modified(etag)
+        view_args = self._get_list_extra_args()
+        _, query = self.get_list(0, None, False, view_args.search, view_args.filters,
+                                 execute=False, page_size=False)
+        # The filtered list query, reduced to its ids, becomes a subquery of the export
+        matching = query.enable_eagerloads(False).with_entities(Service.id).order_by(None).statement
+        return with_etag(csv_response(export_query(Service.id.in_(matching.correlate(None))),
+                                      'gsa_services_filtered'), etag)
+
     @action('export_selected_csv', 'Export Selected to CSV', 'Export selected services to CSV?')
     def action_export_selected_csv(self, ids):
         """Export selected services with entity data as CSV"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write CSV header
-        headers = [
-            'Entity ID', 'Entity Name', 'Entity Category', 'Entity Sector',
-            'Contact Name', 'Contact Position', 'Contact Phone', 'Contact Email',
-            'Service ID', 'Service Name', 'Service Description', 'Interaction Category',
-            'G2G Beneficiary Count', 'Geographic Reach', 'Process Flow',
-            'Has KPI', 'KPI Details', 'Standard Duration', 'Actual Duration',
-            'Users Total', 'Users Female', 'Users Male',
-            'Customer Satisfaction Measured', 'Customer Satisfaction Rating',
-            'Support Available', 'Support Available Via', 'Access Mode', 'Offices Count',
-            'Access Website', 'Access Mobile App', 'Access USSD', 'Access Physical Office',
-            'Requires Internet', 'Self Service Available', 'Supported by IT System',
-            'System Vendor', 'System Ownership', 'System Type',
-            'System Name', 'System Launch Date', 'System Version', 'System Last Update',
-            'System Target Uptime', 'System Actual Uptime', 'Hosting Location', 'Funding Details',
-            'Complies with Standards', 'Standards Details', 'System Integrated',
-            'Integrated Systems', 'Planned Automation', 'Comments'
-        ]
-        writer.writerow(headers)
-        
-        # Query selected services with their related entities
-        services = db.session.query(Service, Entity).join(Entity, Service.entity_id == Entity.id).filter(Service.id.in_(ids)).all()
-        
-        # Write data rows
-        for service, entity in services:
-            row = [
-                entity.id, entity.name, entity.category, entity.sector,
-                entity.contact_name, entity.contact_position, entity.contact_phone, entity.contact_email,
-                service.id, service.service_name, service.description, service.interaction_category,
-                service.g2g_beneficiary_count, service.geographic_reach, service.process_flow,
-                'Yes' if service.has_kpi else 'No', service.kpi_details,
-                service.standard_duration, service.actual_duration,
-                service.users_total, service.users_female, service.users_male,
-                'Yes' if service.customer_satisfaction_measured else 'No', service.customer_satisfaction_rating,
-                'Yes' if service.support_available else 'No', service.support_available_via,
-                service.access_mode, service.offices_count,
-                'Yes' if service.access_website else 'No',
-                'Yes' if service.access_mobile_app else 'No',
-                'Yes' if service.access_ussd else 'No',
-                'Yes' if service.access_physical_office else 'No',
-                'Yes' if service.requires_internet else 'No',
-                'Yes' if service.self_service_available else 'No',
-                'Yes' if service.supported_by_it_system else 'No',
-                service.system_vendor, service.system_ownership, service.system_type,
-                service.system_name, service.system_launch_date, service.system_version,
-                service.system_last_update, service.system_target_uptime, service.system_actual_uptime,
-                service.hosting_location, service.funding_details,
-                'Yes' if service.complies_with_standards else 'No', service.standards_details,
-                'Yes' if service.system_integrated else 'No', service.integrated_systems,
-                'Yes' if service.planned_automation else 'No', service.comments
-            ]
-            writer.writerow(row)
-        
-        # Create the response
-        output.seek(0)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"gsa_services_selected_{timestamp}.csv"
-        
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
+        return csv_response(selected_queries(ids), 'gsa_services_selected')
 
     def is_accessible(self):
         """Only allow access for admins."""
         return current_user.is_authenticated
 
 
-class EntityModelView(ModelView):
+class EntityModelView(KeysetListMixin, ModelView):
+    column_list = ['name', 'category', 'sector', 'contact_name', 'contact_email', 'link_signed_at']
     form_columns = ['name', 'category', 'sector', 'contact_name', 'contact_position', 'contact_phone', 'contact_email']
 
 
     def on_model_change(self, form, model:Entity, is_created):
-        """Override to generate signed link when creating a new entity."""
+        """Override to keep the slug in sync and generate signed link when creating a new entity."""
+        try:
+            model.refresh_slug()
+        except ValueError as e:
+            raise ValidationError(str(e))
+        if not is_created:
+            # A renamed entity must not keep resolving through cached tokens
+            token_cache.invalidate_entity(model.id)
         if is_created:
             # Pass the app's secret key when generating the signed URL
             if not model.signed_service_link:
-                sanitize_name= model.name.lower().replace(" ", "_")
-                model.signed_service_link = url_for('add_service', signed_url=generate_signed_url(sanitize_name))
+                model.sign_link()
         # Call the parent class's method to ensure the model is saved
         return super(EntityModelView, self).on_model_change(form, model, is_created)
 
+    def on_model_delete(self, model:Entity):
+        token_cache.invalidate_entity(model.id)
+        return super(EntityModelView, self).on_model_delete(model)
+
     @action('regenerate_link', 'Regenerate Link', 'Are you sure you want to regenerate the link for selected entities?')
     def action_regenerate_link(self, ids):
         count = 0
-        for entity in Entity.query.filter(Entity.id.in_(ids)).all():
-            sanitize_name = entity.name.lower().replace(" ", "_")
-            entity.signed_service_link = url_for('add_service', signed_url=generate_signed_url(sanitize_name))
-            count += 1
-        db.session.commit()
+        # Commit per chunk so a large selection doesn't hold the write lock for the whole run
+        for start in range(0, len(ids), 200):
+            for entity in Entity.query.filter(Entity.id.in_(ids[start:start + 200])).all():
+                entity.sign_link()
+                count += 1
+            db.session.commit()
         flash(f"Regenerated link for {count} entities.", "success")
 
     def is_accessible(self):
         """Only allow access for admins."""
         return current_user.is_authenticated
 
+SUMMARY_TITLES = [
+    ('interaction_category', 'Interaction Category'),
+    ('access_mode', 'Access Mode'),
+    ('geographic_reach', 'Geographic Reach'),
+    ('hosting_location', 'Hosting Location'),
+    ('channel', 'Digital & Physical Channels'),
+    ('it_system', 'IT System Support'),
+]
+
+class DashboardView(AdminIndexView):
+    @expose('/')
+    def index(self):
+        if not current_user.is_authenticated:
+            return redirect(url_for('login'))
+        link_run = unfinished_run() or LinkRegenerationRun.query.order_by(LinkRegenerationRun.id.desc()).first()
+        return self.render('admin/index.html', link_run=link_run,
+                           expiring_within_days=EXPIRING_WITHIN.days, exports=recent_exports(),
+                           summary=ServiceStat.summary(), summary_titles=SUMMARY_TITLES)
+
+class NearDuplicatesView(BaseView):
+    def is_accessible(self):
+        return current_user.is_authenticated
+
+    def inaccessible_callback(self, name, **kwargs):
+        return redirect(url_for('login'))
+
+    @expose('/')
+    def index(self):
+        kind = request.args.get('kind', 'service')
+        if kind not in KINDS:
+            abort(404)
+        threshold = min(max(request.args.get('threshold', THRESHOLD, type=float), 0.3), 1.0)
+        text = request.args.get('check', '').strip()
+        similar = find_similar(kind, text, threshold) if text else None
+        clusters = near_duplicate_clusters(kind, threshold) if similar is None else []
+        return self.render('admin/near_duplicates.html', kind=kind, kinds=list(KINDS), threshold=threshold,
+                           text=text, similar=similar, clusters=clusters)
+
 # Initialize Flask-Admin
-admin = Admin(app, name='GSA Data Collection Tool - Admin', template_mode='bootstrap3')
+admin = Admin(app, name='GSA Data Collection Tool - Admin', template_mode='bootstrap3', index_view=DashboardView())
 admin.add_view(AdminModelView(User, db.session))
-admin.add_view(EntityModelView(Entity, db.session))
-admin.add_view(ServiceModelView(Service, db.session))
+entity_view = EntityModelView(Entity, db.session)
+service_view = ServiceModelView(Service, db.session)
+admin.add_view(entity_view)
+admin.add_view(service_view)
+admin.add_view(NearDuplicatesView(name='Near Duplicates', endpoint='near_duplicates'))
 
 # Login Manager
 @login_manager.user_loader
@@ -209,6 +484,9 @@ def logout():
     return redirect(url_for('login'))
 
 
+# Services per page of the submission page's list
+SERVICES_PAGE_SIZE = 50
+
 @app.route('/services/<signed_url>', methods=['GET', 'POST'])
 def add_service(signed_url):
 
@@ -223,66 +501,173 @@ def add_service(signed_url):
         flash(f"An error occurred: {str(e)}", "danger")
         return redirect(url_for('expired'))
     
-    # list of all services for the entity
-    services = Service.query.filter_by(entity_id=entity.id).all()
-    
     if request.method == 'POST':
 
         form = ServiceForm()
 
-        if form.validate_on_submit():
+        # A retried or double-clicked submission gets the original result
+        key = form.submission_key.data
+        if key and is_duplicate_submission(key):
+            submission_stats.record(form, accepted=False)
+            flash("Service added successfully!", "success")
+            return redirect(url_for('add_service', signed_url=signed_url))
+
+        accepted = form.validate_on_submit()
+        submission_stats.record(form, accepted)
+        if accepted:
             
-            service = Service(
-                entity_id=entity.id,
-                service_name=form.service_name.data,
-                description=form.description.data,
-                interaction_category=','.join(form.interaction_category.data),
-                g2g_beneficiary_count=form.g2g_beneficiary_count.data,
-                geographic_reach=form.geographic_reach.data,
-                process_flow=form.process_flow.data,
-                has_kpi=(form.has_kpi.data == 'Yes'),
-                kpi_details=form.kpi_details.data,
-                standard_duration=form.standard_duration.data,
-                actual_duration=form.actual_duration.data,
-                users_total=form.users_total.data,
-                users_female=form.users_female.data,
-                users_male=form.users_male.data,
-                customer_satisfaction_measured=(form.customer_satisfaction_measured.data == 'Yes'),
-                customer_satisfaction_rating=form.customer_satisfaction_rating.data,
-                support_available=(form.support_available.data == 'Yes'),
-                support_available_via=','.join(form.support_available_via.data) if form.support_available_via.data else None,
-                access_mode=form.access_mode.data,
-                access_website=(form.access_website.data == 'Yes'),
-                access_mobile_app=(form.access_mobile_app.data == 'Yes'),
-                access_ussd=(form.access_ussd.data == 'Yes'),
-                access_physical_office=(form.access_physical_office.data == 'Yes'),
-                requires_internet=(form.requires_internet.data == 'Yes'),
-                self_service_available=(form.self_service_available.data == 'Yes'),
-                supported_by_it_system=(form.supported_by_it_system.data == 'Yes'),
-                system_name=form.system_name.data,
-                system_launch_date=form.system_launch_date.data,
-                system_version=form.system_version.data,
-                system_last_update=form.system_last_update.data,
-                system_target_uptime=form.system_target_uptime.data,
-                system_actual_uptime=form.system_actual_uptime.data,
-                complies_with_standards=(form.complies_with_standards.data == 'Yes'),
-                standards_details=form.standards_details.data,
-                system_integrated=(form.system_integrated.data == 'Yes'),
-                integrated_systems=form.integrated_systems.data,
-                planned_automation=(form.planned_automation.data == 'Yes'),
-                comments=form.comments.data
-            )
-
-            db.session.add(service)
-            db.session.commit()
+            key = key or str(uuid.uuid4())
+            if submission_queue:
+                # Durable write-behind mode: the background flusher inserts it
+                submission_queue.append(key, entity.id, form.service_values())
+            else:
+                for attempt in range(INSERT_ATTEMPTS):
+                    db.session.add(Service(entity_id=entity.id, submission_key=key, **form.service_values()))
+                    try:
+                        db.session.commit()
+                        break
+                    except IntegrityError:
+                        db.session.rollback()
+                        # Stored by a concurrent retry with the same key: that's our success too.
+                        # Any other violation is retried, then raised rather than reported as saved.
+                        if is_duplicate_submission(key):
+                            break
+                        if attempt == INSERT_ATTEMPTS - 1:
+                            raise
             flash("Service added successfully!", "success")  # Move flash message here
             return redirect(url_for('add_service', signed_url=signed_url))
         else:
-            return render_template('services.html', entity=entity, services=services, signed_url=signed_url, form=form)
+            return render_services_page(entity, signed_url, form, pristine=False)
+
+    # Each rendering carries its own CSRF token and submission key, so it must never be reused
+    form = ServiceForm(formdata=None)
+    response = make_response(render_services_page(entity, signed_url, form, pristine=True))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def render_services_page(entity, signed_url, form, pristine, **context):
+    return render_template('services.html', entity=entity, signed_url=signed_url,
+                           service_form=render_service_form(form, signed_url, pristine),
+                           validation_rules=validation_rules(), **context)
+
+
+@app.route('/services/<signed_url>/form_token')
+def service_form_token(signed_url):
+    """A new CSRF token and submission key, for a services page left open until its token expired"""
+    try:
+        Entity.validate_signed_url(signed_url)
+    except NotFound:
+        return jsonify(error="Invalid or expired signed URL."), 404
+    response = jsonify(csrf_token=generate_csrf(), submission_key=str(uuid.uuid4()))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/services/<signed_url>/list')
+def list_services(signed_url):
+    """
+    One page of the entity's services for the submission page, loaded
+    lazily by the page itself. Pass `after` (the previous page's `next`)
+    to continue.
+    """
+    try:
+        entity = Entity.validate_signed_url(signed_url)
+    except NotFound:
+        return jsonify(error="Invalid or expired signed URL."), 404
+
+    after = request.args.get('after', type=int)
+    limit = max(min(request.args.get('limit', SERVICES_PAGE_SIZE, type=int), 200), 1)
+    etag = strong_etag('services-list', entity.id, entity.services_version, after, limit)
+    if is_fresh(etag):
+        return not_modified(etag)
+    rows, next_after = Service.page_for_entity(entity.id, after=after, limit=limit)
+    return with_etag(jsonify(services=[dict(row._mapping) for row in rows], next=next_after), etag)
+
+
+@app.route('/services/<signed_url>/batch', methods=['POST'])
+def add_services_batch(signed_url):
+    """
+    Add many services in one request: a JSON array of services (or
+    {"services": [...]}) keyed by ServiceForm field names. Valid services
+    are stored together; the response reports each item's outcome.
+    """
+    try:
+        entity = Entity.validate_signed_url(signed_url)
+    except NotFound:
+        return jsonify(error="Invalid or expired signed URL."), 404
+
+    payload = request.get_json(silent=True)
+    items = payload.get('services') if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return jsonify(error="Expected a JSON array of services."), 400
+    if len(items) > BATCH_LIMIT:
+        return jsonify(error=f"At most {BATCH_LIMIT} services per request."), 413
+
+    results = submit_services(entity.id, items, submission_queue)
+    return jsonify(dict(summarize(results), results=results))
+
+
+@app.route('/services/<signed_url>/template.<fmt>')
+def services_template(signed_url, fmt):
+    """Blank spreadsheet with one column per service field, for bulk uploads"""
+    try:
+        Entity.validate_signed_url(signed_url)
+    except NotFound:
+        return redirect(url_for('expired'))
+    if fmt == 'csv':
+        return Response(template_csv(), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=services_template.csv'})
+    if fmt == 'xlsx':
+        try:
+            content = template_xlsx()
+        except ImportError:
+            abort(404)
+        return Response(content, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                        headers={'Content-Disposition': 'attachment; filename=services_template.xlsx'})
+    abort(404)
+
+
+@app.route('/services/<signed_url>/upload', methods=['POST'])
+def upload_services(signed_url):
+    """Add the services in an uploaded CSV/XLSX template, reporting rows that need fixing"""
+    try:
+        entity = Entity.validate_signed_url(signed_url)
+    except NotFound:
+        return redirect(url_for('expired'))
+
+    upload = None
+    file = request.files.get('file')
+    if not file or not file.filename:
+        upload = {'error': "Choose a CSV or XLSX file to upload."}
+    else:
+        try:
+            rows = read_upload(file)
+        except ValueError as e:
+            upload = {'error': str(e)}
+        else:
+            if len(rows) > BATCH_LIMIT:
+                upload = {'error': f"At most {BATCH_LIMIT} services per upload; split the file."}
+            else:
+                results = submit_services(entity.id, [item for _, item in rows], submission_queue)
+                upload = dict(summarize(results), problems=[
+                    (rows[result['index']][0], result['errors']) for result in results if result['status'] == 'invalid'])
+
+    return render_services_page(entity, signed_url, ServiceForm(formdata=None),
+                                pristine=True, upload=upload)
 
-    form = ServiceForm()
 
-    return render_template('services.html', entity=entity, services=services, signed_url=signed_url, form=form)
+def is_duplicate_submission(key):
+    """Whether a submission with this key was already stored (or queued)."""
+    if db.session.execute(select(Service.id).where(Service.submission_key == key)).first():
+        return True
+    return bool(submission_queue) and submission_queue.contains(key)
+
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted build output of `flask build-assets`"""
+    return send_asset(filename)
 
 
 @app.route('/thank_you')
@@ -296,78 +681,85 @@ def expired():
 @app.route('/admin/export_csv')
 @login_required
 def export_csv():
-    """Export all services with entity data as CSV"""
+    """Queue an export of all services with entity data (or reuse the current one)"""
     if not current_user.is_authenticated:
         flash("You must be logged in to access this feature.", "danger")
         return redirect(url_for('login'))
     
-    # Create a string buffer to write CSV data
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write CSV header
-    headers = [
-        'Entity ID', 'Entity Name', 'Entity Category', 'Entity Sector',
-        'Contact Name', 'Contact Position', 'Contact Phone', 'Contact Email',
-        'Service ID', 'Service Name', 'Service Description', 'Interaction Category',
-        'G2G Beneficiary Count', 'Geographic Reach', 'Process Flow',
-        'Has KPI', 'KPI Details', 'Standard Duration', 'Actual Duration',
-        'Users Total', 'Users Female', 'Users Male',
-        'Customer Satisfaction Measured', 'Customer Satisfaction Rating',
-        'Support Available', 'Support Available Via', 'Access Mode', 'Offices Count',
-        'Access Website', 'Access Mobile App', 'Access USSD', 'Access Physical Office',
-        'Requires Internet', 'Self Service Available', 'Supported by IT System',
-        'System Vendor', 'System Ownership', 'System Type',
-        'System Name', 'System Launch Date', 'System Version', 'System Last Update',
-        'System Target Uptime', 'System Actual Uptime', 'Hosting Location', 'Funding Details',
-        'Complies with Standards', 'Standards Details', 'System Integrated',
-        'Integrated Systems', 'Planned Automation', 'Comments'
-    ]
-    writer.writerow(headers)
-    
-    # Query services with their related entities
-    services = db.session.query(Service, Entity).join(Entity, Service.entity_id == Entity.id).all()
-    
-    # Write data rows
-    for service, entity in services:
-        row = [
-            entity.id, entity.name, entity.category, entity.sector,
-            entity.contact_name, entity.contact_position, entity.contact_phone, entity.contact_email,
-            service.id, service.service_name, service.description, service.interaction_category,
-            service.g2g_beneficiary_count, service.geographic_reach, service.process_flow,
-            'Yes' if service.has_kpi else 'No', service.kpi_details,
-            service.standard_duration, service.actual_duration,
-            service.users_total, service.users_female, service.users_male,
-            'Yes' if service.customer_satisfaction_measured else 'No', service.customer_satisfaction_rating,
-            'Yes' if service.support_available else 'No', service.support_available_via,
-            service.access_mode, service.offices_count,
-            'Yes' if service.access_website else 'No',
-            'Yes' if service.access_mobile_app else 'No',
-            'Yes' if service.access_ussd else 'No',
-            'Yes' if service.access_physical_office else 'No',
-            'Yes' if service.requires_internet else 'No',
-            'Yes' if service.self_service_available else 'No',
-            'Yes' if service.supported_by_it_system else 'No',
-            service.system_vendor, service.system_ownership, service.system_type,
-            service.system_name, service.system_launch_date, service.system_version,
-            service.system_last_update, service.system_target_uptime, service.system_actual_uptime,
-            service.hosting_location, service.funding_details,
-            'Yes' if service.complies_with_standards else 'No', service.standards_details,
-            'Yes' if service.system_integrated else 'No', service.integrated_systems,
-            'Yes' if service.planned_automation else 'No', service.comments
-        ]
-        writer.writerow(row)
-    
-    # Create the response
-    output.seek(0)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"gsa_services_export_{timestamp}.csv"
-    
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename={filename}'}
-    )
+    job = request_export(requested_by=current_user.username)
+    if job.status == 'done':
+        flash("Data hasn't changed since the last export; it is ready to download.", "success")
+    else:
+        flash("Export queued. It will appear below when it is ready.", "success")
+    return redirect(url_for('admin.index'))
+
+@app.route('/admin/exports/delta')
+@login_required
+def export_delta():
+    """Services changed or deleted since the `since` cursor (everything without one), plus the next cursor"""
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            abort(400, description="since must be a cursor returned in X-Next-Cursor.")
+    return delta_csv_response(since or None)
+
+@app.route('/admin/exports/<int:job_id>')
+@login_required
+def download_export(job_id):
+    """Download a finished export artifact"""
+    job = db.get_or_404(ExportJob, job_id)
+    # An artifact's content is fixed by the data version it was built from
+    etag = strong_etag('export', job.id, job.data_version)
+    if is_fresh(etag):
+        return not_modified(etag)
+    if job.status != 'done' or not job.path or not os.path.exists(job.path):
+        raise NotFound("Export is not available.")
+    filename = f"gsa_services_export_{job.finished_at.strftime('%Y%m%d_%H%M%S')}.csv.gz"
+    response = send_file(job.path, mimetype='application/gzip', as_attachment=True, download_name=filename,
+                         etag=etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/admin/regenerate_links', methods=['POST'])
+@login_required
+def regenerate_all_links():
+    """Start (or resume) regenerating all or soon-to-expire links in the background"""
+    scope = 'expiring' if request.form.get('scope') == 'expiring' else 'all'
+    run = regenerate_links_in_background(scope)
+    if run is None:
+        flash("A link regeneration run is already in progress.", "warning")
+    else:
+        flash(f"Regenerating {run.total - run.done} links in the background.", "success")
+    return redirect(url_for('admin.index'))
+
+@app.route('/admin/submission_queue')
+@login_required
+def submission_queue_stats():
+    """Depth and lag of the write-behind submission queue"""
+    if not submission_queue:
+        return jsonify({'enabled': False})
+    return jsonify(dict(submission_queue.stats(), enabled=True))
+
+@app.route('/admin/submission_stats')
+@login_required
+def submission_stats_view():
+    """Form POSTs per accepted submission for this worker"""
+    return jsonify(submission_stats.stats())
+
+@app.route('/admin/token_cache')
+@login_required
+def token_cache_stats():
+    """Hit/miss counters for this worker's signed token cache"""
+    return jsonify(token_cache.stats())
+
+@app.route('/admin/metrics')
+@login_required
+def metrics_view():
+    """This worker's request, SQL and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
 
 # Run the app
 if __name__ == '__main__':
@@ -0,0 +1,240 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import urllib.request
+from urllib.parse import urljoin
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli  # optional; only gzip copies are built without it
+except ImportError:
+    brotli = None
+
+# Pinned upstream files the pages use: logical name -> CDN URL. The CDN URL
+# is also what templates fall back to until `flask build-assets` has run.
+# Bootstrap's CSS is not listed because AdminLTE's stylesheet already contains it.
+VENDOR_ASSETS = {
+    'adminlte.css': 'https://cdn.jsdelivr.net/npm/admin-lte@3.2/dist/css/adminlte.min.css',
+    'fontawesome.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css',
+    'jquery.js': 'https://cdn.jsdelivr.net/npm/jquery@3.6.4/dist/jquery.min.js',
+    'bootstrap.js': 'https://cdn.jsdelivr.net/npm/bootstrap@4.6.2/dist/js/bootstrap.bundle.min.js',
+    'adminlte.js': 'https://cdn.jsdelivr.net/npm/admin-lte@3.2/dist/js/adminlte.min.js',
+}
+
+# Fingerprinted files never change, so clients may keep them for a year
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+CSS_URL = re.compile(r'url\(\s*["\']?([^"\')]+)["\']?\s*\)')
+SOURCE_MAP = re.compile(r'/[*/]# sourceMappingURL=[^\n]*?(\*/)?$', re.M)
+ICON_RULE = re.compile(r'\.fa-([a-z0-9-]+):before\{content:"\\[0-9a-f]+"\}')
+FONT_FACE = re.compile(r'@font-face\{[^}]*\}')
+USED_ICON = re.compile(r'\bfa-([a-z0-9-]+)')
+# Font Awesome font files and the class prefix that uses each
+FONT_STYLES = {'fa-solid-900': ('fas', 'fa'), 'fa-regular-400': ('far',), 'fa-brands-400': ('fab',)}
+# Only woff2 (and woff as a fallback) are served; every supported browser reads them
+KEPT_FONT_FORMATS = ('woff2', 'woff')
+
+
+def _is_local(url):
+    return not url.startswith(('data:', 'http:', 'https:', '//', '#'))
+
+
+def _path(url):
+    return url.split('?')[0].split('#')[0]
+
+
+def _download(url, path):
+    with urllib.request.urlopen(url, timeout=60) as response, open(path, 'wb') as f:
+        f.write(response.read())
+
+
+def fetch_vendor(vendor_dir):
+    """
+    Download the pinned upstream files (and the woff/woff2 fonts their
+    stylesheets reference) into `vendor_dir`, to be committed.
+    """
+    os.makedirs(vendor_dir, exist_ok=True)
+    fetched = []
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(vendor_dir, name)
+        _download(url, path)
+        fetched.append(name)
+        if not name.endswith('.css'):
+            continue
+        with open(path, encoding='utf-8') as f:
+            # Every font style kept, so the vendored files suit any template
+            css = strip_css(f.read(), set(prefix for prefixes in FONT_STYLES.values() for prefix in prefixes))
+        for ref in set(map(_path, CSS_URL.findall(css))):
+            if _is_local(ref):
+                _download(urljoin(url, ref), os.path.join(vendor_dir, os.path.basename(ref)))
+                fetched.append(os.path.basename(ref))
+    return fetched
+
+
+def _used_classes(template_dirs):
+    used = set()
+    for directory in template_dirs:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith('.html'):
+                    with open(os.path.join(root, filename), encoding='utf-8') as f:
+                        text = f.read()
+                    used.update(USED_ICON.findall(text))
+                    used.update(re.findall(r'\b(fa[srb]?)\b', text))
+    return used
+
+
+def strip_css(css, used):
+    """
+    Drop what the pages never use: source map references, Font Awesome icon
+    rules for icons no template mentions, font faces of unused styles, and
+    font formats other than woff2/woff.
+    """
+    css = SOURCE_MAP.sub('', css)
+    css = ICON_RULE.sub(lambda m: m.group(0) if m.group(1) in used else '', css)
+
+    def font_face(match):
+        block = match.group(0)
+        font = re.search(r'fa-(?:solid-900|regular-400|brands-400)', block)
+        if font and not used.intersection(FONT_STYLES[font.group(0)]):
+            return ''
+        urls = [url for url in CSS_URL.findall(block) if _path(url).endswith(KEPT_FONT_FORMATS)]
+        if not urls:
+            return block
+        src = ','.join(f'url({url}) format("{_path(url).rsplit(".", 1)[1]}")' for url in urls)
+        block = re.sub(r'src:[^;}]*;?', '', block)
+        return block[:-1].rstrip(';') + ';src:' + src + '}'
+
+    return FONT_FACE.sub(font_face, css)
+
+
+def _fingerprint(name, content):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}'
+
+
+def _write(dist_dir, filename, content):
+    with open(os.path.join(dist_dir, filename), 'wb') as f:
+        f.write(content)
+    if filename.endswith(('.css', '.js')):
+        with open(os.path.join(dist_dir, filename + '.gz'), 'wb') as f:
+            f.write(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            with open(os.path.join(dist_dir, filename + '.br'), 'wb') as f:
+                f.write(brotli.compress(content))
+
+
+def build_assets(vendor_dir, dist_dir, template_dirs):
+    """
+    Build `dist_dir` from the vendored files: strip unused CSS, name every
+    file after a hash of its content, precompress CSS/JS, and write
+    manifest.json mapping logical names to built filenames. Files from
+    earlier builds are removed.
+    """
+    os.makedirs(dist_dir, exist_ok=True)
+    used = _used_classes(template_dirs)
+    manifest, files = {}, set()
+
+    for name in VENDOR_ASSETS:
+        path = os.path.join(vendor_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} is missing; run `flask build-assets --fetch` first.")
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        if name.endswith('.css'):
+            css = strip_css(content.decode('utf-8'), used)
+
+            def relink(match):
+                ref = match.group(1)
+                if not _is_local(ref):
+                    return match.group(0)
+                base = os.path.basename(_path(ref))
+                with open(os.path.join(vendor_dir, base), 'rb') as f:
+                    data = f.read()
+                filename = _fingerprint(base, data)
+                if filename not in files:
+                    _write(dist_dir, filename, data)
+                    files.add(filename)
+                return f'url({filename})'
+
+            content = CSS_URL.sub(relink, css).encode('utf-8')
+        else:
+            content = SOURCE_MAP.sub('', content.decode('utf-8')).encode('utf-8')
+
+        filename = _fingerprint(name, content)
+        _write(dist_dir, filename, content)
+        files.add(filename)
+        manifest[name] = filename
+
+    manifest_path = os.path.join(dist_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    for filename in os.listdir(dist_dir):
+        built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if filename != 'manifest.json' and built not in files:
+            os.remove(os.path.join(dist_dir, filename))
+    return manifest
+
+
+def built_dir():
+    return os.path.join(current_app.static_folder, 'dist')
+
+
+class Manifest:
+    """manifest.json of the current build, reloaded when a new build replaces it."""
+
+    def __init__(self):
+        self._version = None
+        self._entries = {}
+
+    def version(self):
+        try:
+            return os.stat(os.path.join(built_dir(), 'manifest.json')).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def entries(self):
+        version = self.version()
+        if version != self._version:
+            entries = {}
+            if version is not None:
+                with open(os.path.join(built_dir(), 'manifest.json')) as f:
+                    entries = json.load(f)
+            self._entries, self._version = entries, version
+        return self._entries
+
+
+manifest = Manifest()
+
+
+def asset_url(name):
+    """URL of a vendored asset: the fingerprinted build, or the CDN if there is no build."""
+    filename = manifest.entries().get(name)
+    if filename:
+        return url_for('asset', filename=filename)
+    return VENDOR_ASSETS[name]
+
+
+def send_asset(filename):
+    """Serve a built file, precompressed when the client accepts it, cached for good."""
+    directory = built_dir()
+    mimetype = mimetypes.guess_type(filename)[0] or ('font/woff2' if filename.endswith('.woff2') else None)
+    encodings = [encoding for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                 if os.path.exists(os.path.join(directory, filename + suffix))]
+    encoding = request.accept_encodings.best_match(encodings) if encodings else None
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+
+    response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
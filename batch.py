@@ -0,0 +1,178 @@
+import csv
+import io
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from wtforms import RadioField, SelectMultipleField
+
+from forms import ServiceForm
+from models import db, Service
+from submissions import INSERT_ATTEMPTS
+
+# Services accepted in one batch request or upload
+BATCH_LIMIT = 500
+TRUE_VALUES = ('yes', 'y', 'true', '1')
+
+
+def _blank_form():
+    return ServiceForm(formdata=None, meta={'csrf': False})
+
+
+def service_fields():
+    """Names of the ServiceForm fields a batch item may set."""
+    return [field.name for field in _blank_form() if field.name != 'submission_key'] + ['submission_key']
+
+
+def _formdata(item, form):
+    """
+    Turn one batch item (JSON object or spreadsheet row) into form data.
+    Booleans and yes/true/1 become 'Yes' for Yes/No questions, and
+    multi-select answers may be a list or a comma-separated string.
+    """
+    data = MultiDict()
+    for name, value in item.items():
+        if value is None or value == '':
+            continue
+        field = form[name]
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(field, SelectMultipleField):
+            values = value if isinstance(value, list) else str(value).split(',')
+            for choice in values:
+                if str(choice).strip():
+                    data.add(name, str(choice).strip())
+        elif isinstance(field, RadioField) and field.choices == [('Yes', 'Yes'), ('No', 'No')]:
+            yes = value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+            data.add(name, 'Yes' if yes else 'No')
+        else:
+            data.add(name, str(value).strip())
+    return data
+
+
+def validate_items(items):
+    """
+    Validate each item against ServiceForm.
+    Returns [(index, form or None, errors)]; `form` is None for invalid items.
+    """
+    known = set(service_fields())
+    blank = _blank_form()
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append((index, None, {'': ['Each service must be an object.']}))
+            continue
+        unknown = [name for name in item if name not in known]
+        if unknown:
+            results.append((index, None, dict((name, ['Unknown field.']) for name in unknown)))
+            continue
+        form = ServiceForm(formdata=_formdata(item, blank), meta={'csrf': False})
+        if form.validate():
+            results.append((index, form, None))
+        else:
+            results.append((index, None, form.errors))
+    return results
+
+
+def submit_services(entity_id, items, queue=None):
+    """
+    Validate `items` and store every valid one in a single transaction (or
+    a single write-behind queue append). Invalid items don't stop the
+    others. Items whose submission_key is already stored are reported as
+    duplicates, so a retried batch doesn't create rows twice.
+
+    Returns one result dict per item, in order.
+    """
+    validated = validate_items(items)
+    keys = dict((index, form.submission_key.data or str(uuid.uuid4()))
+                for index, form, _ in validated if form)
+
+    for attempt in range(INSERT_ATTEMPTS):
+        seen = stored_keys(keys.values())
+        if queue:
+            seen |= queue.pending_keys() & set(keys.values())
+
+        results, accepted = [], []
+        for index, form, errors in validated:
+            if form is None:
+                results.append({'index': index, 'status': 'invalid', 'errors': errors})
+                continue
+            key = keys[index]
+            if key in seen:
+                results.append({'index': index, 'status': 'duplicate', 'submission_key': key})
+                continue
+            seen.add(key)
+            accepted.append((key, entity_id, form.service_values()))
+            results.append({'index': index, 'status': 'created', 'submission_key': key})
+
+        if queue:
+            if accepted:
+                queue.append_many(accepted)
+            return results
+        for key, entity, values in accepted:
+            db.session.add(Service(entity_id=entity, submission_key=key, **values))
+        try:
+            db.session.commit()
+            return results
+        except IntegrityError:
+            db.session.rollback()
+            # Only a concurrent retry storing some of these keys first is worth another look;
+            # any other violation (e.g. the entity was deleted) won't go away by retrying
+            if attempt == INSERT_ATTEMPTS - 1 or not stored_keys(key for key, _, _ in accepted):
+                raise
+
+
+def stored_keys(keys):
+    """The subset of `keys` already stored as services' submission keys."""
+    return set(db.session.execute(
+        db.select(Service.submission_key).where(Service.submission_key.in_(list(keys)))).scalars())
+
+
+def summarize(results):
+    summary = {'created': 0, 'duplicate': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
+
+
+def template_csv():
+    out = io.StringIO()
+    csv.writer(out).writerow(service_fields())
+    return out.getvalue()
+
+
+def template_xlsx():
+    from openpyxl import Workbook  # optional dependency, only needed for XLSX
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Services'
+    sheet.append(service_fields())
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def read_upload(file):
+    """
+    Non-blank rows of an uploaded CSV or XLSX file as (row number, dict
+    keyed by the header row); the header is row 1.
+    """
+    if file.filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX uploads are not available on this server; upload a CSV file instead.")
+        sheet = load_workbook(io.BytesIO(file.read()), read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+        items = [dict((name, value) for name, value in zip(header, row) if name) for row in rows]
+    else:
+        try:
+            text = file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError("The file is not a UTF-8 CSV file.")
+        items = [dict((name.strip(), value) for name, value in row.items() if name)
+                 for row in csv.DictReader(io.StringIO(text, newline=''))]
+    return [(number, item) for number, item in enumerate(items, start=2)
+            if any(value not in (None, '') for value in item.values())]
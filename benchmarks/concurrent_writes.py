@@ -0,0 +1,92 @@
+"""
+Concurrent submission benchmark.
+
+Simulates several gunicorn workers (processes) each committing service rows
+one at a time, the way add_service does, against a throwaway SQLite file.
+Runs once with SQLite's defaults (rollback journal, FULL sync) and once with
+the pragmas applied by database.configure_sqlite (WAL, NORMAL sync, busy
+timeout), and reports submits/sec and "database is locked" failures.
+
+    python benchmarks/concurrent_writes.py [workers] [submits_per_worker]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from database import configure_sqlite, engine_options
+from models import db, Entity, Service
+
+MODES = {
+    'default': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 1000},
+    'tuned': None,  # database.sqlite_pragmas()
+}
+
+
+def make_app(path, pragmas):
+    app = Flask(__name__)
+    url = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, pragmas)
+    return app
+
+
+def worker(path, mode, submits, results):
+    app = make_app(path, MODES[mode])
+    ok = failed = 0
+    with app.app_context():
+        for i in range(submits):
+            # Like add_service: read the entity's services, then insert and commit
+            Service.query.filter_by(entity_id=1).count()
+            db.session.add(Service(entity_id=1, service_name=f'{os.getpid()}-{i}',
+                                   description='Benchmark service ' * 10, access_mode='Both'))
+            try:
+                db.session.commit()
+                ok += 1
+            except OperationalError:
+                db.session.rollback()
+                failed += 1
+    results.put((ok, failed))
+
+
+def run(mode, workers, submits):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = make_app(path, MODES[mode])
+        with app.app_context():
+            db.create_all()
+            db.session.add(Entity(name='Benchmark', slug='benchmark'))
+            db.session.commit()
+            db.engine.dispose()
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, mode, submits, results))
+                     for _ in range(workers)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+    ok = sum(t[0] for t in totals)
+    failed = sum(t[1] for t in totals)
+    print(f"{mode:<8} {workers} workers  {ok:>6} committed  {failed:>5} locked  "
+          f"{elapsed:6.2f}s  {ok / elapsed:8.0f} submits/sec")
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    submits = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    for mode in MODES:
+        run(mode, workers, submits)
@@ -0,0 +1,101 @@
+"""
+Export throughput benchmark.
+
+Seeds a throwaway SQLite database with N services and measures rows/sec for
+the legacy ORM export (hydrating Service/Entity pairs) and the Core export
+used by /admin/export_csv.
+
+    python benchmarks/export_bench.py               # 10k, 100k and 1M services
+    python benchmarks/export_bench.py 10000 50000
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Entity, Service
+from exports import EXPORT_COLUMNS, EXPORT_HEADERS, iter_csv, export_query
+
+SIZES = [10_000, 100_000, 1_000_000]
+SERVICES_PER_ENTITY = 50
+
+
+def seed(count):
+    """Insert `count` services spread over entities with Core bulk inserts."""
+    entities = max(1, count // SERVICES_PER_ENTITY)
+    db.session.execute(insert(Entity), [
+        {'id': i + 1, 'name': f'Entity {i}', 'category': 'Ministry', 'sector': 'ICT',
+         'contact_name': 'Jane Doe', 'contact_email': 'jane@example.com'}
+        for i in range(entities)
+    ])
+    batch = []
+    for i in range(count):
+        batch.append({
+            'entity_id': i % entities + 1, 'service_name': f'Service {i}',
+            'description': 'A service description ' * 5, 'interaction_category': 'G2C,G2B',
+            'process_flow': 'Apply, review, approve', 'has_kpi': i % 2 == 0,
+            'users_total': i, 'access_mode': 'Both', 'access_website': True,
+            'supported_by_it_system': i % 3 == 0, 'hosting_location': 'Cloud',
+        })
+        if len(batch) == 10_000:
+            db.session.execute(insert(Service), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Service), batch)
+    db.session.commit()
+
+
+def orm_export():
+    """The pre-Core export: hydrate both ORM objects and read every attribute."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    query = db.session.query(Service, Entity).join(Entity, Service.entity_id == Entity.id)
+    for rows, (service, entity) in enumerate(query.yield_per(1000), 1):
+        objects = {Service: service, Entity: entity}
+        values = []
+        for _, column, encoder in EXPORT_COLUMNS:
+            value = getattr(objects[column.class_], column.key)
+            values.append(encoder(value) if encoder else value)
+        writer.writerow(values)
+        if rows % 1000 == 0:
+            buffer.seek(0)
+            buffer.truncate()
+
+
+def core_export():
+    for _ in iter_csv(export_query()):
+        pass
+
+
+def measure(label, fn, count):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{count:>10,} services  {label:<5} {elapsed:8.2f}s  {count / elapsed:12,.0f} rows/sec")
+
+
+def main(sizes):
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            db.init_app(app)
+            with app.app_context():
+                db.create_all()
+                seed(count)
+                measure('orm', orm_export, count)
+                measure('core', core_export, count)
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,60 @@
+"""
+Submission page render benchmark.
+
+Requests the service form page (GET /services/<signed_url>) repeatedly
+through the test client against a throwaway SQLite database, once rendering
+the whole form through Jinja on every request and once using the cached form
+skeleton (fragments.FormSkeletonCache), and reports latency percentiles.
+
+    python benchmarks/render_bench.py [requests]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+REQUESTS = 500
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    path = os.path.join(tempfile.mkdtemp(), 'render.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+    from app import app
+    from models import db, Entity
+
+    with app.app_context():
+        db.create_all()
+        entity = Entity(name='Ministry of Benchmarks')
+        entity.refresh_slug()
+        db.session.add(entity)
+        db.session.flush()
+        entity.sign_link()
+        db.session.commit()
+        link = entity.signed_service_link
+
+    client = app.test_client()
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+    for mode, cached in (('uncached', False), ('cached', True)):
+        app.config['FORM_FRAGMENT_CACHE'] = cached
+        client.get(link)  # warm up templates, token cache and skeleton
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get(link)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        timings.sort()
+        p50 = statistics.median(timings) * 1000
+        p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+        print(f"{mode:<10}{p50:>10.2f}{p95:>10.2f}{len(timings) / sum(timings):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
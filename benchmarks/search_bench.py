@@ -0,0 +1,111 @@
+"""
+Service search benchmark.
+
+Seeds a throwaway SQLite database with N services whose free-text fields
+are drawn from a fixed vocabulary, then times the first page (50 rows) of
+matches and their total (what the admin list shows) for a few searches,
+through the FTS5 index (search.matching_services) and through the
+LIKE '%word%' scan over the same columns that Flask-Admin's default search
+runs. LIKE also matches inside words ("renew" finds "renewal"); the index
+matches words and word prefixes.
+
+    python benchmarks/search_bench.py               # 100k services
+    python benchmarks/search_bench.py 10000 250000
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import and_, func, insert, or_, select
+
+from models import db, Entity, Service
+from search import SEARCH_COLUMNS, matching_services, words
+
+SIZES = [100_000]
+SERVICES_PER_ENTITY = 50
+PAGE = 50
+REPEAT = 5
+# Domain words, each in a few percent of services, among common filler words
+KEYWORDS = [f'{stem}{suffix}' for stem in (
+    'passport', 'licence', 'permit', 'registration', 'tax', 'land', 'health', 'school', 'water', 'court',
+    'pension', 'vehicle', 'business', 'birth', 'marriage', 'trade', 'customs', 'grant', 'farm', 'road',
+) for suffix in ('', 's', 'ing', 'er', 'al')] + ['online', 'certificate', 'renewal', 'district', 'payment']
+FILLER = [f'word{i}' for i in range(3000)]
+KEYWORD_SHARE = 0.05
+SEARCHES = ['passport', 'customs certificate', 'road permit online', 'renew', 'zzz']
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(KEYWORDS if rng.random() < KEYWORD_SHARE else FILLER) for _ in range(length))
+
+
+def seed(count):
+    """Insert `count` services spread over entities with Core bulk inserts (indexed by the FTS triggers)."""
+    rng = random.Random(42)
+    entities = max(1, count // SERVICES_PER_ENTITY)
+    db.session.execute(insert(Entity), [{'id': i + 1, 'name': f'Entity {i}'} for i in range(entities)])
+    batch = []
+    for i in range(count):
+        batch.append({
+            'entity_id': i % entities + 1, 'service_name': sentence(rng, 3),
+            'description': sentence(rng, 30), 'process_flow': sentence(rng, 15),
+            'kpi_details': sentence(rng, 8), 'comments': sentence(rng, 10),
+        })
+        if len(batch) == 10_000:
+            db.session.execute(insert(Service), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Service), batch)
+    db.session.commit()
+
+
+def fts_page(term):
+    """Best-ranked page and the total, as the admin list shows them."""
+    matches = matching_services(term)
+    total = db.session.scalar(select(func.count()).select_from(matches))
+    return total, db.session.execute(select(matches.c.id).order_by(matches.c.rank).limit(PAGE)).all()
+
+
+def like_page(term):
+    columns = [getattr(Service, name) for name in SEARCH_COLUMNS]
+    condition = and_(*[or_(*[c.like(f'%{word}%') for c in columns]) for word in words(term)])
+    total = db.session.scalar(select(func.count()).select_from(Service).where(condition))
+    return total, db.session.execute(select(Service.id).where(condition).order_by(Service.id).limit(PAGE)).all()
+
+
+def measure(fn, term):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        total, _ = fn(term)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, total
+
+
+def main(sizes):
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            db.init_app(app)
+            with app.app_context():
+                db.create_all()
+                start = time.perf_counter()
+                seed(count)
+                print(f"{count:,} services seeded and indexed in {time.perf_counter() - start:.1f}s")
+                print(f"{'search':<22}{'fts ms':>10}{'like ms':>10}{'fts hits':>10}{'like hits':>10}")
+                for term in SEARCHES:
+                    fts_ms, fts_hits = measure(fts_page, term)
+                    like_ms, like_hits = measure(like_page, term)
+                    print(f"{term:<22}{fts_ms:>10.1f}{like_ms:>10.1f}{fts_hits:>10}{like_hits:>10}")
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,92 @@
+"""
+Near-duplicate detection benchmark.
+
+Seeds a throwaway SQLite database with N services of random text, a few
+percent of them edited copies of another service (a word dropped or
+swapped, a typo), then times building the MinHash index and finding the
+duplicate groups (similarity.near_duplicate_clusters), and reports how many
+planted copies were found. Both should grow about linearly with N; comparing
+every pair grows with N².
+
+    python benchmarks/similarity_bench.py               # 10k and 40k services
+    python benchmarks/similarity_bench.py 100000
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Entity, Service
+from similarity import near_duplicate_clusters, rebuild_similarity_index
+
+SIZES = [10_000, 40_000]
+SERVICES_PER_ENTITY = 50
+COPY_SHARE = 0.03
+VOCABULARY = [''.join(random.Random(i).choices('abcdefghijklmnopqrstuvwxyz', k=random.Random(-i).randint(3, 10)))
+              for i in range(5000)]
+
+
+def edit(rng, text):
+    """A near-copy: one word dropped, one replaced and one letter changed."""
+    words = text.split()
+    del words[rng.randrange(len(words))]
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    i = rng.randrange(len(words))
+    words[i] = words[i][:-1] + 'x'
+    return ' '.join(words)
+
+
+def seed(count):
+    """Insert `count` services with Core bulk inserts; returns {copy id: original id}."""
+    rng = random.Random(42)
+    entities = max(1, count // SERVICES_PER_ENTITY)
+    db.session.execute(insert(Entity), [{'id': i + 1, 'name': f'Entity {i}'} for i in range(entities)])
+    rows, copies = [], {}
+    for i in range(count):
+        if rows and rng.random() < COPY_SHARE:
+            original = rng.randrange(len(rows))
+            name, description = rows[original]['service_name'], edit(rng, rows[original]['description'])
+            copies[i + 1] = original + 1
+        else:
+            name = ' '.join(rng.choices(VOCABULARY, k=3))
+            description = ' '.join(rng.choices(VOCABULARY, k=rng.randint(15, 40)))
+        rows.append({'id': i + 1, 'entity_id': i % entities + 1, 'service_name': name, 'description': description})
+    db.session.execute(insert(Service), rows)
+    db.session.commit()
+    return copies
+
+
+def main(sizes):
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            db.init_app(app)
+            with app.app_context():
+                db.create_all()
+                copies = seed(count)
+                start = time.perf_counter()
+                rebuild_similarity_index(('service',))
+                indexed = time.perf_counter() - start
+                start = time.perf_counter()
+                clusters = near_duplicate_clusters('service')
+                clustered = time.perf_counter() - start
+                grouped = {}
+                for _, members in clusters:
+                    for record_id, _ in members:
+                        grouped[record_id] = members[0][0]
+                found = sum(1 for copy, original in copies.items()
+                            if copy in grouped and grouped[copy] == grouped.get(original))
+                print(f"{count:,} services: indexed in {indexed:.1f}s, grouped in {clustered:.2f}s, "
+                      f"{len(clusters)} groups, {found}/{len(copies)} planted copies found")
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
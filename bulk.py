@@ -0,0 +1,188 @@
+import csv
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+
+from models import db, Entity, LinkRegenerationRun, utcnow
+from utils import SIGNED_URL_MAX_AGE, slugify
+
+# Columns accepted in an entity import file (only `name` is required)
+ENTITY_IMPORT_COLUMNS = ['name', 'category', 'sector', 'contact_name', 'contact_position',
+                         'contact_phone', 'contact_email']
+LINK_SHEET_HEADERS = ['Entity ID', 'Entity Name', 'Category', 'Contact Name', 'Contact Email', 'Service Link']
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_entities(source, link_sheet, batch_size=500, regenerate_links=False, base_url=''):
+    """
+    Upsert entities from a CSV file object and write a link sheet.
+
+    Rows are matched to existing entities by slug, so re-running the same
+    file updates entities in place instead of duplicating them. Existing
+    links are kept unless `regenerate_links` is set. Each batch is written
+    in a single transaction.
+
+    Returns a dict of counters.
+    """
+    reader = csv.DictReader(source)
+    if not reader.fieldnames or 'name' not in reader.fieldnames:
+        raise ValueError("Import file must have a 'name' column.")
+    columns = [column for column in ENTITY_IMPORT_COLUMNS if column in reader.fieldnames]
+
+    writer = csv.writer(link_sheet)
+    writer.writerow(LINK_SHEET_HEADERS)
+
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'signed': 0}
+    start = time.perf_counter()
+
+    for batch in _batches(reader, batch_size):
+        # Rows sharing a name are merged in order: later values win, blank cells keep earlier ones
+        by_slug = {}
+        for row in batch:
+            stats['rows'] += 1
+            name = (row.get('name') or '').strip()
+            if not name:
+                stats['skipped'] += 1
+                continue
+            values = by_slug.setdefault(slugify(name), dict.fromkeys(columns))
+            for column in columns:
+                value = (row.get(column) or '').strip() or None
+                if value is not None:
+                    values[column] = value
+
+        existing = {entity.slug: entity for entity in Entity.query.filter(Entity.slug.in_(list(by_slug)))}
+
+        entities = []
+        for slug, values in by_slug.items():
+            entity = existing.get(slug)
+            if entity is None:
+                entity = Entity(slug=slug)
+                db.session.add(entity)
+                stats['created'] += 1
+            else:
+                stats['updated'] += 1
+            for column, value in values.items():
+                # Blank cells never clear existing values
+                if value is not None or entity.id is None:
+                    setattr(entity, column, value)
+            entities.append(entity)
+
+        # Assign ids to new entities, then sign every missing link in one pass
+        db.session.flush()
+        for entity in entities:
+            if regenerate_links or not entity.signed_service_link:
+                entity.sign_link()
+                stats['signed'] += 1
+        links = [
+            [entity.id, entity.name, entity.category, entity.contact_name, entity.contact_email,
+             base_url + entity.signed_service_link]
+            for entity in entities
+        ]
+        db.session.commit()
+        db.session.expunge_all()
+        writer.writerows(links)
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+# Default window for "regenerate expiring soon"
+EXPIRING_WITHIN = timedelta(days=2)
+# A run that has not reported progress for this long is considered abandoned
+STALE_RUN_AFTER = timedelta(minutes=5)
+
+
+def _pending(run):
+    """Entities the run still has to sign."""
+    return Entity.query.filter(or_(Entity.link_signed_at.is_(None), Entity.link_signed_at < run.cutoff))
+
+
+def unfinished_run():
+    return LinkRegenerationRun.query.filter(LinkRegenerationRun.finished_at.is_(None)) \
+        .order_by(LinkRegenerationRun.id.desc()).first()
+
+
+def start_link_regeneration(scope='all', expiring_within=EXPIRING_WITHIN):
+    """
+    Return the unfinished regeneration run if there is one, otherwise
+    create a new run for `scope` ('all' or 'expiring').
+    """
+    run = unfinished_run()
+    if run:
+        return run
+
+    now = utcnow()
+    if scope == 'expiring':
+        # Links signed before this moment expire within `expiring_within`
+        cutoff = now - timedelta(seconds=SIGNED_URL_MAX_AGE) + expiring_within
+    else:
+        cutoff = now
+    run = LinkRegenerationRun(scope=scope, cutoff=cutoff, started_at=now, updated_at=now)
+    run.total = _pending(run).count()
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def regenerate_links(run, chunk_size=200, progress=None):
+    """
+    Sign the pending entities of `run`, committing once per chunk.
+    `progress(run)` is called after every chunk.
+    """
+    while True:
+        chunk = _pending(run).order_by(Entity.id).limit(chunk_size).all()
+        if not chunk:
+            break
+        for entity in chunk:
+            entity.sign_link()
+        run.done += len(chunk)
+        run.updated_at = utcnow()
+        db.session.commit()
+        if progress:
+            progress(run)
+
+    run.finished_at = utcnow()
+    db.session.commit()
+    return run
+
+
+_worker = None
+
+
+def regenerate_links_in_background(scope='all'):
+    """
+    Start (or resume) a regeneration run on a background thread.
+    Returns the run, or None if another run is still making progress.
+    """
+    global _worker
+    if _worker and _worker.is_alive():
+        return None
+    run = unfinished_run()
+    if run and utcnow() - run.updated_at < STALE_RUN_AFTER:
+        # Another worker (or the CLI) is still making progress
+        return None
+    run = start_link_regeneration(scope)
+
+    app = current_app._get_current_object()
+    run_id = run.id
+
+    def work():
+        with app.app_context():
+            regenerate_links(db.session.get(LinkRegenerationRun, run_id))
+
+    _worker = threading.Thread(target=work, name=f'link-regeneration-{run_id}', daemon=True)
+    _worker.start()
+    return run
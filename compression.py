@@ -0,0 +1,92 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli  # optional; gzip only without it
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/csv', 'text/plain', 'text/css', 'application/json',
+                          'application/javascript'}
+# Smaller bodies aren't worth the CPU or the extra header
+MIN_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+ENCODERS = {'gzip': _Gzip}
+if brotli is not None:
+    ENCODERS['br'] = _Brotli
+
+
+def _negotiate():
+    """Best encoding the client accepts, preferring brotli."""
+    return request.accept_encodings.best_match([encoding for encoding in ('br', 'gzip') if encoding in ENCODERS])
+
+
+def _stream(chunks, encoder):
+    """Compress a streamed body chunk by chunk without buffering it."""
+    try:
+        for chunk in chunks:
+            data = encoder.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    after_request hook: gzip/brotli-encode HTML, JSON and CSV responses for
+    clients that accept it. Streamed bodies are compressed as they stream.
+    The ETag gets an encoding suffix so each representation's stays strong.
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate()
+    if not encoding:
+        return response
+    encoder = ENCODERS[encoding]()
+
+    if response.is_streamed:
+        response.response = _stream(response.response, encoder)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        response.set_data(encoder.compress(data) + encoder.finish())
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
@@ -0,0 +1,30 @@
+import hashlib
+
+from flask import Response, request
+
+# Suffixes compress_response adds to the ETag of an encoded representation
+ENCODED_ETAG_SUFFIXES = ('-gzip', '-br')
+
+
+def strong_etag(*parts):
+    """ETag for a representation fully determined by `parts` (versions, ids, arguments)."""
+    return hashlib.sha1('\x1f'.join(map(str, parts)).encode('utf-8')).hexdigest()[:24]
+
+
+def is_fresh(etag):
+    """Whether the client's copy (If-None-Match) is current, in any content encoding."""
+    return any(etag + suffix in request.if_none_match for suffix in ('',) + ENCODED_ETAG_SUFFIXES)
+
+
+def not_modified(etag, cache_control='private, no-cache'):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def with_etag(response, etag, cache_control='private, no-cache'):
+    """Mark `response` as revalidatable with `etag`."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
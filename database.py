@@ -0,0 +1,64 @@
+import os
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = 'sqlite:///services.db'
+
+
+def database_url():
+    """DATABASE_URL from the environment, defaulting to the local SQLite file."""
+    return os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL)
+
+
+def engine_options(url):
+    """
+    SQLAlchemy engine options for `url`, tunable from the environment.
+
+    SQLite gets a small pool of long-lived connections (each one carries the
+    pragmas set by `configure_sqlite`); server databases get a larger pool
+    with pre-ping and recycling so idle connections dropped by the server or
+    a proxy are replaced transparently.
+    """
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # In-memory databases use a single connection per thread
+            return {}
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        }
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas():
+    return {
+        # WAL lets readers proceed while a writer commits, and commits are a
+        # single append instead of a rollback-journal rewrite
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        # NORMAL is durable against application crashes in WAL mode and
+        # skips the fsync on every commit
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        # Wait this many ms for the write lock instead of failing with "database is locked"
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 10000)),
+    }
+
+
+def configure_sqlite(engine, pragmas=None):
+    """Apply the SQLite pragmas to every new connection made by `engine`."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
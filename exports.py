@@ -0,0 +1,230 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+from flask import Response, stream_with_context
+from sqlalchemy import select, union
+from models import db, Entity, Service, ServiceTombstone, utcnow
+
+# Number of rows fetched from the database (and written to the client) at a time
+EXPORT_CHUNK_SIZE = 1000
+# Delta export windows close this long before now, so rows stamped by
+# transactions still in flight when a window closes land in the next window
+DELTA_SETTLE = timedelta(minutes=1)
+
+# Ids bound per statement when exporting an explicit selection, well under
+# SQLite's bound-variable limit (999 before 3.32)
+ID_CHUNK_SIZE = 500
+
+
+def yes_no(value):
+    """Encode a boolean (or NULL) as Yes/No."""
+    return 'Yes' if value else 'No'
+
+
+# Single source of truth for export formats: (header, column, encoder).
+# Columns without an encoder are written as-is (NULL becomes an empty cell).
+EXPORT_COLUMNS = [
+    ('Entity ID', Entity.id, None),
+    ('Entity Name', Entity.name, None),
+    ('Entity Category', Entity.category, None),
+    ('Entity Sector', Entity.sector, None),
+    ('Contact Name', Entity.contact_name, None),
+    ('Contact Position', Entity.contact_position, None),
+    ('Contact Phone', Entity.contact_phone, None),
+    ('Contact Email', Entity.contact_email, None),
+    ('Service ID', Service.id, None),
+    ('Service Name', Service.service_name, None),
+    ('Service Description', Service.description, None),
+    ('Interaction Category', Service.interaction_category, None),
+    ('G2G Beneficiary Count', Service.g2g_beneficiary_count, None),
+    ('Geographic Reach', Service.geographic_reach, None),
+    ('Process Flow', Service.process_flow, None),
+    ('Has KPI', Service.has_kpi, yes_no),
+    ('KPI Details', Service.kpi_details, None),
+    ('Standard Duration', Service.standard_duration, None),
+    ('Actual Duration', Service.actual_duration, None),
+    ('Users Total', Service.users_total, None),
+    ('Users Female', Service.users_female, None),
+    ('Users Male', Service.users_male, None),
+    ('Customer Satisfaction Measured', Service.customer_satisfaction_measured, yes_no),
+    ('Customer Satisfaction Rating', Service.customer_satisfaction_rating, None),
+    ('Support Available', Service.support_available, yes_no),
+    ('Support Available Via', Service.support_available_via, None),
+    ('Access Mode', Service.access_mode, None),
+    ('Offices Count', Service.offices_count, None),
+    ('Access Website', Service.access_website, yes_no),
+    ('Access Mobile App', Service.access_mobile_app, yes_no),
+    ('Access USSD', Service.access_ussd, yes_no),
+    ('Access Physical Office', Service.access_physical_office, yes_no),
+    ('Requires Internet', Service.requires_internet, yes_no),
+    ('Self Service Available', Service.self_service_available, yes_no),
+    ('Supported by IT System', Service.supported_by_it_system, yes_no),
+    ('System Vendor', Service.system_vendor, None),
+    ('System Ownership', Service.system_ownership, None),
+    ('System Type', Service.system_type, None),
+    ('System Name', Service.system_name, None),
+    ('System Launch Date', Service.system_launch_date, None),
+    ('System Version', Service.system_version, None),
+    ('System Last Update', Service.system_last_update, None),
+    ('System Target Uptime', Service.system_target_uptime, None),
+    ('System Actual Uptime', Service.system_actual_uptime, None),
+    ('Hosting Location', Service.hosting_location, None),
+    ('Funding Details', Service.funding_details, None),
+    ('Complies with Standards', Service.complies_with_standards, yes_no),
+    ('Standards Details', Service.standards_details, None),
+    ('System Integrated', Service.system_integrated, yes_no),
+    ('Integrated Systems', Service.integrated_systems, None),
+    ('Planned Automation', Service.planned_automation, yes_no),
+    ('Comments', Service.comments, None),
+]
+
+EXPORT_HEADERS = [header for header, _, _ in EXPORT_COLUMNS]
+
+
+def compile_row_encoder(columns=EXPORT_COLUMNS):
+    """
+    Build a function that turns a result row into a list of cell values.
+    Only the columns that have an encoder are touched, so plain columns are
+    copied straight from the row tuple.
+    """
+    encoders = [(index, encoder) for index, (_, _, encoder) in enumerate(columns) if encoder]
+
+    def encode(row):
+        values = list(row)
+        for index, encoder in encoders:
+            values[index] = encoder(values[index])
+        return values
+
+    return encode
+
+
+encode_row = compile_row_encoder()
+
+
+def export_query(*criteria):
+    """Core select of the export columns, optionally filtered."""
+    stmt = select(*[column for _, column, _ in EXPORT_COLUMNS]).join_from(
+        Service, Entity, Service.entity_id == Entity.id)
+    if criteria:
+        stmt = stmt.where(*criteria)
+    return stmt.order_by(Service.id)
+
+
+def selected_queries(ids, chunk_size=ID_CHUNK_SIZE):
+    """Export statements for an explicit selection of service ids, in id order, `chunk_size` ids each."""
+    ids = sorted(set(map(int, ids)))
+    return [export_query(Service.id.in_(ids[start:start + chunk_size]))
+            for start in range(0, len(ids), chunk_size)]
+
+
+def iter_rows(stmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of encoded rows, `chunk_size` rows at a time.
+    `stmt` may also be a list of statements, whose rows follow one another.
+    """
+    for statement in stmt if isinstance(stmt, list) else [stmt]:
+        result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [encode_row(row) for row in partition]
+
+
+def iter_csv(stmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the export as CSV text, one chunk of rows at a time.
+    Rows are fetched with `yield_per` so only one chunk is held in memory.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_HEADERS)
+    yield buffer.getvalue()
+
+    for rows in iter_rows(stmt, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def csv_response(stmt, prefix):
+    """Stream the export as a CSV attachment named after `prefix`."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{prefix}_{timestamp}.csv"
+
+    return Response(
+        stream_with_context(iter_csv(stmt)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def changed_service_ids(since, until):
+    """
+    Ids of services changed in (since, until]: edited themselves, or through
+    their entity's exported details. `since=None` means from the beginning.
+    """
+    def window(column):
+        return [column <= until] + ([column > since] if since else [])
+
+    return union(select(Service.id).where(*window(Service.updated_at)),
+                 select(Service.id).join(Entity, Service.entity_id == Entity.id).where(*window(Entity.updated_at)))
+
+
+def delta_window(since):
+    """(since, until] of a delta export; until is the cursor of the next one."""
+    until = utcnow() - DELTA_SETTLE
+    return since, (max(until, since) if since else until)
+
+
+def iter_delta_csv(since, until, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the changes in (since, until] as CSV text: a Change column
+    ('delete' or 'upsert') followed by the export columns. Deletions come
+    first, so applying the rows in order always leaves the current state,
+    even when a deleted id has been reused.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(['Change'] + EXPORT_HEADERS)
+    yield flush()
+
+    entity_index = EXPORT_HEADERS.index('Entity ID')
+    service_index = EXPORT_HEADERS.index('Service ID')
+    deleted = select(ServiceTombstone.entity_id, ServiceTombstone.service_id) \
+        .where(ServiceTombstone.deleted_at <= until).order_by(ServiceTombstone.id)
+    if since:
+        deleted = deleted.where(ServiceTombstone.deleted_at > since)
+    result = db.session.execute(deleted.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        for entity_id, service_id in partition:
+            row = [''] * len(EXPORT_HEADERS)
+            row[entity_index], row[service_index] = entity_id, service_id
+            writer.writerow(['delete'] + row)
+        yield flush()
+
+    upserts = export_query(Service.id.in_(changed_service_ids(since, until)))
+    for rows in iter_rows(upserts, chunk_size):
+        writer.writerows(['upsert'] + row for row in rows)
+        yield flush()
+
+
+def delta_csv_response(since):
+    """
+    Stream the changes since the cursor `since` (None for everything) as a
+    CSV attachment. The next cursor is returned in the X-Next-Cursor header.
+    """
+    since, until = delta_window(since)
+    filename = f"gsa_services_delta_{until.strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(
+        stream_with_context(iter_delta_csv(since, until)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Next-Cursor': until.isoformat()}
+    )
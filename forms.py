@@ -1,19 +1,56 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, IntegerField, SelectField, SelectMultipleField, RadioField
-from wtforms.validators import DataRequired, Optional, InputRequired, NumberRange
+import threading
+import uuid
+from collections import Counter, namedtuple
 
+from wtforms import StringField, TextAreaField, IntegerField, SelectField, SelectMultipleField, RadioField, HiddenField
+from wtforms.validators import DataRequired, Optional, InputRequired, NumberRange, UUID
+
+INTERACTION_CATEGORIES = [
+    ('G2G', 'Government to Government (G2G)'),
+    ('G2B', 'Government to Business (G2B)'),
+    ('G2C', 'Government to Citizen (G2C)'),
+]
+
+GEOGRAPHIC_REACH = [
+    ('Central Government', 'Central Government'),
+    ('Local Government','Local Government'),
+    ('Regional (East Africa)', 'Regional (East Africa)'),
+    ('Global (Worldwide)','Global (Worldwide)'),
+    ('Local (Internal to the entity only)','Local (Internal to the entity only)'),
+    ('Sub County','Sub County'),
+    ('Parish', 'Parish'),
+]
+
+ACCESS_MODES = [
+    ('Digital Only', 'Digital Only'),
+    ('Physical Only', 'Physical Only'),
+    ('Both', 'Both')
+]
+
+HOSTING_LOCATIONS = [
+    ('Cloud', 'Cloud'),
+    ('On-premise', 'On-premise'),
+    ('Hybrid', 'Hybrid')
+]
+
+SUPPORT_CHANNELS = [
+    ('Call Center', 'Call Center'),
+    ('Help Desk', 'Help Desk'),
+    ('Online Chat', 'Online Chat'),
+    ('Email', 'Email'),
+    ('Social Media', 'Social Media')
+]
 
 class ServiceForm(FlaskForm):
+    # One-time key rendered with every form; a repeated POST with the same key is a duplicate
+    submission_key = HiddenField(default=lambda: str(uuid.uuid4()), validators=[Optional(), UUID()])
     service_name = StringField('Service Name', validators=[DataRequired()],
                                description="This refers to the official name of the government service delivered by the entity")
     description = TextAreaField("Service Description (a brief explanation of what a particular service is, who it is for, and what it entails)", validators=[
                                 DataRequired()], description="This refers to a brief explanation of what a particular service is, who it is for, and what it entails")
     interaction_category = SelectMultipleField("Which category best describes the nature of interaction for this service? (Select one or more options)",
-                                               choices=[
-                                                   ('G2G', 'Government to Government (G2G)'),
-                                                   ('G2B', 'Government to Business (G2B)'),
-                                                   ('G2C', 'Government to Citizen (G2C)'),
-                                               ],
+                                               choices=INTERACTION_CATEGORIES,
                                                coerce=str,
                                                validators=[InputRequired()],
                                                description="This aims to identify the target user of the service. This will be dissagregated according to; Government to Government (G2G), Government to Business (G2B) and Government to Citizen (G2C). Select all options that apply"
@@ -21,15 +58,7 @@ class ServiceForm(FlaskForm):
     g2g_beneficiary_count = IntegerField(
         'If G2G, how many entities benefit from the service? (All entities benefiting including the host entity)', validators=[Optional(), NumberRange(min=0, message="Please enter a positive number")])
     geographic_reach = SelectField('At what level is this service primarily delivered? (Targeted Geographic_Reach)?- Select one',
-                                   choices=[
-                                       ('Central Government', 'Central Government'),
-                                       ('Local Government','Local Government'),
-                                       ('Regional (East Africa)', 'Regional (East Africa)'),
-                                       ('Global (Worldwide)','Global (Worldwide)'),
-                                       ('Local (Internal to the entity only)','Local (Internal to the entity only)'),
-                                       ('Sub County','Sub County'),
-                                       ('Parish', 'Parish'),
-                                   ],
+                                   choices=GEOGRAPHIC_REACH,
                                    validators=[Optional()])
     process_flow = TextAreaField(
         'What are the key steps a user must follow to access and complete this service (process flow of the service)? Please include all stages, from the initial request to fulfillment', validators=[DataRequired()],
@@ -69,24 +98,14 @@ class ServiceForm(FlaskForm):
     )
     support_available_via = SelectMultipleField(
         'If Yes, how is support provided? (select all that apply)',
-        choices=[
-            ('Call Center', 'Call Center'),
-            ('Help Desk', 'Help Desk'),
-            ('Online Chat', 'Online Chat'),
-            ('Email', 'Email'),
-            ('Social Media', 'Social Media')
-        ],
+        choices=SUPPORT_CHANNELS,
         coerce=str,
         validators=[Optional()],
         description="This refers to the channels through which users can access help or support related to the specific government service. Select all options that apply"
     )
 
     access_mode = SelectField('How is this service accessed by users? (select any of the options; Digital Only, Physical Only or Both)',
-                              choices=[
-                                  ('Digital Only', 'Digital Only'),
-                                  ('Physical Only', 'Physical Only'),
-                                  ('Both', 'Both')
-                              ],
+                              choices=ACCESS_MODES,
                               validators=[DataRequired()],
                               render_kw={"class": "radio-group"}
                               )
@@ -133,11 +152,7 @@ class ServiceForm(FlaskForm):
 
     hosting_location = SelectField(
         'Where is the IT system hosted? (select one)',
-        choices=[
-            ('Cloud', 'Cloud'),
-            ('On-premise', 'On-premise'),
-            ('Hybrid', 'Hybrid')
-        ],
+        choices=HOSTING_LOCATIONS,
         validators=[Optional()]
     )
     
@@ -207,62 +222,131 @@ class ServiceForm(FlaskForm):
 
     comments = TextAreaField('Additional Comments', validators=[Optional()])
 
+    def service_values(self):
+        """Column values for a Service built from the submitted form."""
+        return dict(
+            service_name=self.service_name.data,
+            description=self.description.data,
+            interaction_category=','.join(self.interaction_category.data),
+            g2g_beneficiary_count=self.g2g_beneficiary_count.data,
+            geographic_reach=self.geographic_reach.data,
+            process_flow=self.process_flow.data,
+            has_kpi=(self.has_kpi.data == 'Yes'),
+            kpi_details=self.kpi_details.data,
+            standard_duration=self.standard_duration.data,
+            actual_duration=self.actual_duration.data,
+            users_total=self.users_total.data,
+            users_female=self.users_female.data,
+            users_male=self.users_male.data,
+            customer_satisfaction_measured=(self.customer_satisfaction_measured.data == 'Yes'),
+            customer_satisfaction_rating=self.customer_satisfaction_rating.data,
+            support_available=(self.support_available.data == 'Yes'),
+            support_available_via=','.join(self.support_available_via.data) if self.support_available_via.data else None,
+            access_mode=self.access_mode.data,
+            offices_count=self.offices_count.data,
+            access_website=(self.access_website.data == 'Yes'),
+            access_mobile_app=(self.access_mobile_app.data == 'Yes'),
+            access_ussd=(self.access_ussd.data == 'Yes'),
+            access_physical_office=(self.access_physical_office.data == 'Yes'),
+            requires_internet=(self.requires_internet.data == 'Yes'),
+            self_service_available=(self.self_service_available.data == 'Yes'),
+            supported_by_it_system=(self.supported_by_it_system.data == 'Yes'),
+            system_vendor=self.system_vendor.data,
+            system_ownership=self.system_ownership.data,
+            system_type=self.system_type.data,
+            system_name=self.system_name.data,
+            system_launch_date=self.system_launch_date.data,
+            system_version=self.system_version.data,
+            system_last_update=self.system_last_update.data,
+            system_target_uptime=self.system_target_uptime.data,
+            system_actual_uptime=self.system_actual_uptime.data,
+            hosting_location=self.hosting_location.data,
+            funding_details=self.funding_details.data,
+            complies_with_standards=(self.complies_with_standards.data == 'Yes'),
+            standards_details=self.standards_details.data,
+            system_integrated=(self.system_integrated.data == 'Yes'),
+            integrated_systems=self.integrated_systems.data,
+            planned_automation=(self.planned_automation.data == 'Yes'),
+            comments=self.comments.data
+        )
+
     def validate(self, extra_validators=None):
-        if not super(ServiceForm, self).validate(extra_validators=extra_validators):
-            return False
-
-        # Conditional validation for 'offices_count' if 'access_mode' is 'Physical Only'
-        if self.access_mode.data == 'Physical Only':
-            if not self.offices_count.data or self.offices_count.data <= 0:
-                self.offices_count.errors.append('Offices count must be greater than 0 when access mode is Physical Only.')
-                return False
-
-        # Conditional validation for 'kpi_details' if 'has_kpi' is True
-        if self.has_kpi.data == 'Yes' and not self.kpi_details.data:
-            self.kpi_details.errors.append('This field is required when "Has KPI" is selected.')
-            return False
-
-        # Conditional validation for 'system_name' if 'supported_by_it_system' is True
-        if self.supported_by_it_system.data == 'Yes' and not self.system_name.data:
-            self.system_name.errors.append('This field is required when "Supported by IT System" is selected.')
-            return False
-
-        # Conditional validation for 'integrated_systems' if 'system_integrated' is True
-        if self.system_integrated.data == 'Yes' and not self.integrated_systems.data:
-            self.integrated_systems.errors.append('This field is required when "System Integrated" is selected.')
-            return False
-
-        # Conditional validation for 'g2g_beneficiary_count' if 'G2G' is selected in 'interaction_category'
-        if 'G2G' in self.interaction_category.data and not self.g2g_beneficiary_count.data:
-            self.g2g_beneficiary_count.errors.append('This field is required when "G2G" is selected in Interaction Category.')
-            return False
-
-        # Conditional validation for 'customer_satisfaction_rating' if 'customer_satisfaction_measured' is True
-        if self.customer_satisfaction_measured.data == 'Yes' and not self.customer_satisfaction_rating.data:
-            self.customer_satisfaction_rating.errors.append('This field is required when "Customer Satisfaction Measured" is selected.')
-            return False
-
-        # Conditional validation for 'standards_details' if 'complies_with_standards' is True
-        if self.complies_with_standards.data == 'Yes' and not self.standards_details.data:
-            self.standards_details.errors.append('This field is required when "Complies with Standards" is selected.')
-            return False
-
-        # Conditional validation if 'supported_by_it_system' is True
-        if self.supported_by_it_system.data == 'Yes':
-            if not self.system_name.data:
-                self.system_name.errors.append('This field is required when "Supported by IT System" is selected.')
-                return False
-
-            if not self.hosting_location.data:
-                self.hosting_location.errors.append('This field is required when "Supported by IT System" is selected.')
-                return False
-            if not self.funding_details.data:
-                self.funding_details.errors.append('This field is required when "Supported by IT System" is selected.')
-                return False
-
-        # Conditional validation for 'support_available_via' if 'support_available' is True
-        if self.support_available.data == 'Yes' and not self.support_available_via.data:
-            self.support_available_via.errors.append('This field is required when "Support Available" is selected.')
-            return False
-
-        return True
\ No newline at end of file
+        """Run the field validators and every conditional rule, collecting all errors."""
+        valid = super(ServiceForm, self).validate(extra_validators=extra_validators)
+        for rule in CONDITIONAL_RULES:
+            field = self[rule.field]
+            if field.errors or not rule.applies(self[rule.when].data):
+                continue
+            if not rule.satisfied(field.data):
+                field.errors.append(rule.message)
+                valid = False
+        return valid
+
+
+class Rule(namedtuple('Rule', 'field when equals check message')):
+    """`field` must pass `check` ('required' or 'positive') when `when` equals (or includes) `equals`."""
+
+    def applies(self, value):
+        return value == self.equals or (isinstance(value, list) and self.equals in value)
+
+    def satisfied(self, value):
+        if self.check == 'positive':
+            return bool(value) and value > 0
+        return bool(value)
+
+
+IT_SYSTEM_REQUIRED = 'This field is required when "Supported by IT System" is selected.'
+
+# Conditional rules of ServiceForm; also served to the browser by `validation_rules()`
+CONDITIONAL_RULES = [
+    Rule('offices_count', 'access_mode', 'Physical Only', 'positive',
+         'Offices count must be greater than 0 when access mode is Physical Only.'),
+    Rule('kpi_details', 'has_kpi', 'Yes', 'required', 'This field is required when "Has KPI" is selected.'),
+    Rule('system_name', 'supported_by_it_system', 'Yes', 'required', IT_SYSTEM_REQUIRED),
+    Rule('hosting_location', 'supported_by_it_system', 'Yes', 'required', IT_SYSTEM_REQUIRED),
+    Rule('funding_details', 'supported_by_it_system', 'Yes', 'required', IT_SYSTEM_REQUIRED),
+    Rule('integrated_systems', 'system_integrated', 'Yes', 'required',
+         'This field is required when "System Integrated" is selected.'),
+    Rule('g2g_beneficiary_count', 'interaction_category', 'G2G', 'required',
+         'This field is required when "G2G" is selected in Interaction Category.'),
+    Rule('customer_satisfaction_rating', 'customer_satisfaction_measured', 'Yes', 'required',
+         'This field is required when "Customer Satisfaction Measured" is selected.'),
+    Rule('standards_details', 'complies_with_standards', 'Yes', 'required',
+         'This field is required when "Complies with Standards" is selected.'),
+    Rule('support_available_via', 'support_available', 'Yes', 'required',
+         'This field is required when "Support Available" is selected.'),
+]
+
+
+def validation_rules():
+    return [rule._asdict() for rule in CONDITIONAL_RULES]
+
+
+class SubmissionStats:
+    """Form POSTs per accepted submission in this process, and the fields that sent respondents back."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.posts = 0
+        self.accepted = 0
+        self.rejected_fields = Counter()
+
+    def record(self, form, accepted):
+        with self._lock:
+            self.posts += 1
+            if accepted:
+                self.accepted += 1
+            else:
+                self.rejected_fields.update(form.errors.keys())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'posts': self.posts,
+                'accepted': self.accepted,
+                'posts_per_accepted': round(self.posts / self.accepted, 3) if self.accepted else None,
+                'rejected_fields': dict(self.rejected_fields.most_common(10)),
+            }
+
+
+submission_stats = SubmissionStats()
@@ -0,0 +1,69 @@
+import os
+import uuid
+
+from flask import current_app, render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup, escape
+
+import forms
+from forms import ServiceForm
+
+SERVICE_FORM_TEMPLATE = '_service_form.html'
+
+# Stand-ins rendered into the cached skeleton and swapped for each request's values
+SIGNED_URL_SENTINEL = 'signed-url-sentinel'
+CSRF_SENTINEL = 'csrf-token-sentinel'
+KEY_SENTINEL = 'submission-key-sentinel'
+
+
+class FormSkeletonCache:
+    """
+    The add-service form rendered once per process with no data or errors.
+
+    The markup only depends on ServiceForm and its template, so it is
+    rebuilt whenever forms.py or the template file changes on disk. The
+    signed URL, CSRF token and submission key are rendered as sentinels
+    and replaced per request.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._html = None
+        self.builds = 0
+
+    def get(self):
+        version = source_version(SERVICE_FORM_TEMPLATE)
+        if version != self._version:
+            skeleton = ServiceForm(formdata=None)
+            skeleton.submission_key.data = KEY_SENTINEL
+            if 'csrf_token' in skeleton:
+                skeleton.csrf_token.current_token = CSRF_SENTINEL
+            self._html = render_template(SERVICE_FORM_TEMPLATE, form=skeleton, signed_url=SIGNED_URL_SENTINEL)
+            self._version = version
+            self.builds += 1
+        return self._html
+
+
+form_skeleton = FormSkeletonCache()
+
+
+def source_version(*templates):
+    """Modification times of forms.py and `templates`."""
+    paths = [forms.__file__] + [os.path.join(current_app.root_path, current_app.template_folder, name)
+                                for name in templates]
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def render_service_form(form, signed_url, pristine):
+    """
+    Markup of the add-service form: the cached skeleton when `form` is
+    pristine (not bound to submitted data), a full render otherwise.
+    """
+    if not pristine or not current_app.config.get('FORM_FRAGMENT_CACHE', True):
+        return Markup(render_template(SERVICE_FORM_TEMPLATE, form=form, signed_url=signed_url))
+
+    html = form_skeleton.get().replace(SIGNED_URL_SENTINEL, escape(signed_url))
+    html = html.replace(KEY_SENTINEL, str(uuid.uuid4()))
+    if CSRF_SENTINEL in html:
+        html = html.replace(CSRF_SENTINEL, escape(generate_csrf()))
+    return Markup(html)
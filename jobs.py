@@ -0,0 +1,103 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from flask import current_app
+
+from exports import iter_csv, export_query
+from metrics import metrics
+from models import db, Counter, ExportJob, utcnow
+
+# Queued/running jobs older than this are assumed to have died with their worker
+STALE_JOB_AFTER = timedelta(hours=1)
+# Finished artifacts kept on disk
+KEEP_ARTIFACTS = 5
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=current_app.config.get('EXPORT_WORKERS', 1),
+                                       thread_name_prefix='export')
+    return _executor
+
+
+def export_dir():
+    path = os.path.join(current_app.instance_path, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def request_export(requested_by=None):
+    """
+    Return a job for the current data version: an existing artifact if the
+    data hasn't changed since it was built, a job that is already building
+    it, or a newly queued job.
+    """
+    version = Counter.get('data')
+    candidates = ExportJob.query.filter(ExportJob.data_version == version,
+                                        ExportJob.status.in_(['queued', 'running', 'done'])) \
+        .order_by(ExportJob.id.desc())
+    for job in candidates:
+        if job.status == 'done' and job.path and os.path.exists(job.path):
+            return job
+        if job.status != 'done' and utcnow() - job.created_at < STALE_JOB_AFTER:
+            return job
+
+    job = ExportJob(data_version=version, requested_by=requested_by)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_export, app, job.id)
+    return job
+
+
+@metrics.timed('export_job')
+def _run_export(app, job_id):
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+
+        path = os.path.join(export_dir(), f'gsa_services_v{job.data_version}_{job.id}.csv.gz')
+        try:
+            with gzip.open(path + '.part', 'wt', encoding='utf-8', newline='') as artifact:
+                for chunk in iter_csv(export_query()):
+                    artifact.write(chunk)
+            os.replace(path + '.part', path)
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = utcnow()
+            db.session.commit()
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+            app.logger.exception("Export job %s failed", job_id)
+            return
+
+        job.status = 'done'
+        job.path = path
+        job.size = os.path.getsize(path)
+        job.finished_at = utcnow()
+        db.session.commit()
+        _prune_artifacts()
+
+
+def _prune_artifacts():
+    """Delete all but the newest KEEP_ARTIFACTS finished artifacts."""
+    old = ExportJob.query.filter(ExportJob.status == 'done', ExportJob.path.isnot(None)) \
+        .order_by(ExportJob.id.desc()).offset(KEEP_ARTIFACTS).all()
+    for job in old:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+        job.path = None
+    db.session.commit()
+
+
+def recent_exports(limit=5):
+    return ExportJob.query.order_by(ExportJob.id.desc()).limit(limit).all()
@@ -0,0 +1,233 @@
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Statements per request
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# Default number of SQL statements a request may issue before it is flagged
+QUERY_BUDGET = 20
+# Profiles kept on disk
+KEEP_PROFILES = 100
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), values + (bound,))} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), values + ("+Inf",))} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, values)} {series[-2]}')
+                lines.append(f'{self.name}_count{_labels(self.labels, values)} {series[-1]}')
+        return lines
+
+
+class Total:
+    """Monotonic counter."""
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, values)} {value}')
+        return lines
+
+
+class Collected:
+    """
+    Value read from a callback at scrape time, for state other modules already
+    keep; `read()` returns a number or {label values: number}.
+    """
+
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name, self.help, self.read, self.labels, self.kind = name, help, read, labels, kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Metrics:
+    """Per-process metrics registry, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self.request_seconds = self.add(Histogram(
+            'gsa_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS, ('endpoint', 'method')))
+        self.request_queries = self.add(Histogram(
+            'gsa_request_sql_statements', 'SQL statements issued per request.', QUERY_BUCKETS, ('endpoint',)))
+        self.sql_seconds = self.add(Total(
+            'gsa_sql_seconds_total', 'Time spent executing SQL, by endpoint ("background" outside requests).',
+            ('endpoint',)))
+        self.sql_statements = self.add(Total(
+            'gsa_sql_statements_total', 'SQL statements executed, by endpoint.', ('endpoint',)))
+        self.budget_exceeded = self.add(Total(
+            'gsa_query_budget_exceeded_total', 'Requests that issued more SQL statements than the query budget.',
+            ('endpoint',)))
+        self.operation_seconds = self.add(Histogram(
+            'gsa_operation_duration_seconds', 'Duration of instrumented operations.', LATENCY_BUCKETS,
+            ('operation',)))
+        self.responses = self.add(Total(
+            'gsa_responses_total', 'Responses by endpoint and status code.', ('endpoint', 'status')))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, name, help, read, labels=(), kind='gauge'):
+        return self.add(Collected(name, help, read, labels, kind))
+
+    def timed(self, operation):
+        """Decorator recording how long each call takes in gsa_operation_duration_seconds."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.operation_seconds.observe(time.perf_counter() - start, operation)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.sql_statements = Counter()
+    g.profiler = None
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0)
+    if rate and random.random() < rate:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = _endpoint()
+    metrics.request_seconds.observe(elapsed, endpoint, request.method)
+    metrics.responses.inc(1, endpoint, g.pop('metrics_status', 500))
+
+    statements = g.pop('sql_statements', Counter())
+    count = sum(statements.values())
+    metrics.request_queries.observe(count, endpoint)
+    budget = current_app.config.get('QUERY_BUDGET', QUERY_BUDGET)
+    if budget:
+        budget = current_app.config.get('QUERY_BUDGETS', {}).get(endpoint, budget)
+    if budget and count > budget:
+        metrics.budget_exceeded.inc(1, endpoint)
+        repeated = [(n, sql.split('\n')[0][:120]) for sql, n in statements.most_common(3) if n > 1]
+        current_app.logger.warning("%s %s issued %d SQL statements (budget %d); most repeated: %s",
+                                   request.method, request.path, count, budget, repeated or 'none')
+
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.disable()
+        _dump_profile(profiler, endpoint, elapsed)
+
+
+def _dump_profile(profiler, endpoint, elapsed):
+    directory = current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{elapsed * 1000:.0f}ms.prof'
+    profiler.dump_stats(os.path.join(directory, name))
+    profiles = sorted(os.listdir(directory))
+    for old in profiles[:-KEEP_PROFILES]:
+        os.remove(os.path.join(directory, old))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_statements' in g:
+        endpoint = _endpoint()
+        g.sql_statements[statement] += 1
+    else:
+        endpoint = 'background'
+    metrics.sql_statements.inc(1, endpoint)
+    metrics.sql_seconds.inc(elapsed, endpoint)
+
+
+def instrument(app, engine):
+    """
+    Record per-endpoint latency, status codes and SQL statement counts and
+    time for every request of `app`. Requests issuing more than QUERY_BUDGET
+    statements (or their endpoint's entry in QUERY_BUDGETS) are logged with their most repeated statement (typically an
+    N+1 loop). With PROFILE_SAMPLE_RATE set, that fraction of requests is
+    profiled and dumped to PROFILE_DIR (instance/profiles by default).
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
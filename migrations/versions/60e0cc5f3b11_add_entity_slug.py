@@ -0,0 +1,54 @@
+"""add entity slug
+
+Revision ID: 60e0cc5f3b11
+Revises: 453e0bd38c94
+Create Date: 2026-10-17 22:19:32.927808
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+from collections import defaultdict
+
+
+# revision identifiers, used by Alembic.
+revision = '60e0cc5f3b11'
+down_revision = '453e0bd38c94'
+branch_labels = None
+depends_on = None
+
+
+def slugify(name):
+    # Frozen copy of utils.slugify at the time of this migration
+    return re.sub(r'[\s_]+', '_', name.strip().lower())
+
+
+def upgrade():
+    # Refuse to continue if two entities normalize to the same slug
+    conn = op.get_bind()
+    entities = sa.table('entities', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('slug', sa.String))
+    by_slug = defaultdict(list)
+    for id, name in conn.execute(sa.select(entities.c.id, entities.c.name)):
+        by_slug[slugify(name)].append((id, name))
+
+    collisions = {slug: rows for slug, rows in by_slug.items() if len(rows) > 1}
+    if collisions:
+        details = '; '.join(
+            ', '.join(f'#{id} "{name}"' for id, name in rows) for rows in collisions.values()
+        )
+        raise RuntimeError(f"Entities with clashing names must be renamed before migrating: {details}")
+
+    with op.batch_alter_table('entities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slug', sa.String(length=255), nullable=True))
+
+    for slug, [(id, _)] in by_slug.items():
+        conn.execute(entities.update().where(entities.c.id == id).values(slug=slug))
+
+    with op.batch_alter_table('entities', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_entities_slug'), ['slug'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('entities', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_entities_slug'))
+        batch_op.drop_column('slug')
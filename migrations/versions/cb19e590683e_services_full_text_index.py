@@ -0,0 +1,45 @@
+"""services full text index
+
+Revision ID: cb19e590683e
+Revises: bbd1bfe097da
+Create Date: 2026-10-17 22:50:41.761433
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb19e590683e'
+down_revision = 'bbd1bfe097da'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of search.FTS_DDL at this revision
+COLUMNS = 'service_name, description, process_flow, kpi_details, standards_details, integrated_systems, comments'
+NEW = ', '.join(f'new.{name.strip()}' for name in COLUMNS.split(','))
+OLD = ', '.join(f'old.{name.strip()}' for name in COLUMNS.split(','))
+
+
+def upgrade():
+    # FTS5 is SQLite only; other databases search with LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(f"CREATE VIRTUAL TABLE services_fts USING fts5({COLUMNS}, content='services', "
+               f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    op.execute(f"CREATE TRIGGER services_fts_insert AFTER INSERT ON services BEGIN "
+               f"INSERT INTO services_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW}); END")
+    op.execute(f"CREATE TRIGGER services_fts_delete AFTER DELETE ON services BEGIN "
+               f"INSERT INTO services_fts(services_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD}); END")
+    op.execute(f"CREATE TRIGGER services_fts_update AFTER UPDATE OF {COLUMNS} ON services BEGIN "
+               f"INSERT INTO services_fts(services_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD}); "
+               f"INSERT INTO services_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW}); END")
+    op.execute("INSERT INTO services_fts(services_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        op.execute(f"DROP TRIGGER services_fts_{trigger}")
+    op.execute("DROP TABLE services_fts")
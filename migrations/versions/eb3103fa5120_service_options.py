@@ -0,0 +1,51 @@
+"""service options
+
+Revision ID: eb3103fa5120
+Revises: 5e77e99eb5c9
+Create Date: 2026-10-17 22:24:41.504040
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eb3103fa5120'
+down_revision = '5e77e99eb5c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('service_options',
+    sa.Column('service_id', sa.Integer(), nullable=False),
+    sa.Column('field', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.String(length=50), nullable=False),
+    sa.ForeignKeyConstraint(['service_id'], ['services.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('service_id', 'field', 'value')
+    )
+    with op.batch_alter_table('service_options', schema=None) as batch_op:
+        batch_op.create_index('ix_service_options_field_value', ['field', 'value', 'service_id'], unique=False)
+
+    # Backfill from the comma-separated columns
+    conn = op.get_bind()
+    services = sa.table('services', sa.column('id', sa.Integer),
+                        sa.column('interaction_category', sa.String), sa.column('support_available_via', sa.String))
+    options = sa.table('service_options', sa.column('service_id', sa.Integer),
+                       sa.column('field', sa.String), sa.column('value', sa.String))
+    rows = []
+    for id, interaction_category, support_available_via in conn.execute(sa.select(services)):
+        for field, value in (('interaction_category', interaction_category), ('support_available_via', support_available_via)):
+            rows += [{'service_id': id, 'field': field, 'value': v} for v in sorted(set((value or '').split(','))) if v]
+        if len(rows) >= 5000:
+            conn.execute(options.insert(), rows)
+            rows = []
+    if rows:
+        conn.execute(options.insert(), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('service_options', schema=None) as batch_op:
+        batch_op.drop_index('ix_service_options_field_value')
+
+    op.drop_table('service_options')
@@ -1,10 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from collections import Counter as Tally
 from flask_login import UserMixin
-from utils import generate_signed_url,validate_signed_url
+from metrics import metrics
+from utils import generate_signed_url, load_signed_url, service_link, slugify, token_cache
 from werkzeug.exceptions import NotFound
+from datetime import datetime, timezone
 
 db = SQLAlchemy()
 
+
+def utcnow():
+    """Naive UTC timestamp, as stored in DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
 
@@ -25,6 +37,8 @@ class Entity(db.Model):
     
     # Entity details
     name = db.Column(db.String(255), nullable=False)
+    # Normalized name used to resolve signed links (see utils.slugify)
+    slug = db.Column(db.String(255), nullable=True, unique=True, index=True)
     category = db.Column(db.String(100), nullable=True)
     sector = db.Column(db.String(100), nullable=True)
     
@@ -35,47 +49,114 @@ class Entity(db.Model):
     contact_email = db.Column(db.String(100), nullable=True)
 
     signed_service_link = db.Column(db.String(255), nullable=True)
+    # When signed_service_link was last signed (links expire after utils.SIGNED_URL_MAX_AGE)
+    link_signed_at = db.Column(db.DateTime, nullable=True, index=True)
+    # Bumped whenever one of the entity's services changes (ETag of its services list)
+    services_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Maintained by touch_timestamps; delta exports select on updated_at
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    # Bookkeeping columns whose changes don't alter exported data, so don't touch updated_at
+    UNTRACKED_COLUMNS = {'slug', 'signed_service_link', 'link_signed_at', 'services_version',
+                         'created_at', 'updated_at'}
 
     # Relationship to services is already defined in the Service model
 
     def __repr__(self):
         return f"<Entity {self.name}>"
 
+    def __str__(self):
+        return self.name or ''
+
+    def refresh_slug(self):
+        """
+        Recompute the slug from the name.
+        Raises ValueError if another entity already normalizes to the same slug.
+        """
+        slug = slugify(self.name)
+        conflict = Entity.query.filter(Entity.slug == slug, Entity.id != self.id).first()
+        if conflict:
+            raise ValueError(f'Entity name "{self.name}" clashes with existing entity "{conflict.name}".')
+        self.slug = slug
+
     @classmethod
+    @metrics.timed('validate_signed_url')
     def validate_signed_url(cls, signed_url):
         """
         Validates the signed URL and retrieves the associated entity ID.
         If the URL is invalid or expired, it raises a NotFound exception.
+        Verified tokens are cached per process until they expire.
         """
-        entity_name:str = validate_signed_url(signed_url)
-        # Check if the entity exists in the database
-        entity:Entity = cls.query.filter(Entity.name.ilike(entity_name.replace("_"," "))).first()
+        entity_id = token_cache.get(signed_url)
+        if entity_id is not None:
+            entity = db.session.get(cls, entity_id)
+            if entity:
+                return entity
+
+        entity_name, expires_at = load_signed_url(signed_url)
+        # Indexed lookup on the unique slug column
+        entity:Entity = cls.query.filter_by(slug=slugify(entity_name)).one_or_none()
 
         if not entity:
             raise NotFound("Entity not found.")
+        token_cache.set(signed_url, entity.id, expires_at)
         return entity
 
-    def save(self, secret_key):
+    def sign_link(self):
+        """(Re)generate the signed link to this entity's service form."""
+        self.signed_service_link = service_link(generate_signed_url(self.slug))
+        self.link_signed_at = utcnow()
+        token_cache.invalidate_entity(self.id)
+
+    def save(self):
         """Save the entity to the database."""
+        self.refresh_slug()
         # Generate a signed URL for adding a service
         if not self.signed_service_link:
-            self.signed_service_link = generate_signed_url(self.name.lower().replace(" ", "_"), secret_key)
+            self.sign_link()
         # Save the entity to the database
         db.session.add(self)
         db.session.commit()
     
 
+class LinkRegenerationRun(db.Model):
+    """
+    A bulk link regeneration job. Entities whose link was signed before
+    `cutoff` (or never) are still to do, so an interrupted run can resume
+    without re-signing the entities it already finished.
+    """
+    __tablename__ = 'link_regeneration_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # all, expiring
+    cutoff = db.Column(db.DateTime, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<LinkRegenerationRun {self.id} {self.scope} {self.done}/{self.total}>"
+
+
 class Service(db.Model):
     __tablename__ = 'services'
 
     id = db.Column(db.Integer, primary_key=True)
-    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False, index=True)
+    # Unique per submission, so a replayed or repeated submission is stored once
+    submission_key = db.Column(db.String(36), nullable=True, unique=True, index=True)
+    # Maintained by touch_timestamps; delta exports select on updated_at
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
 
     service_name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
     interaction_category = db.Column(db.String(100), nullable=True)
     g2g_beneficiary_count = db.Column(db.Integer, nullable=True)
-    geographic_reach = db.Column(db.String(100), nullable=True)
+    geographic_reach = db.Column(db.String(100), nullable=True, index=True)
     process_flow = db.Column(db.Text, nullable=True)
 
     has_kpi = db.Column(db.Boolean, default=False)
@@ -94,7 +175,7 @@ class Service(db.Model):
     support_available = db.Column(db.Boolean, default=False)
     support_available_via = db.Column(db.String(100), nullable=True)  # e.g., Phone, Email, Chat
 
-    access_mode = db.Column(db.String(50), nullable=True)  # e.g., Digital only, Physical only, Both
+    access_mode = db.Column(db.String(50), nullable=True, index=True)  # e.g., Digital only, Physical only, Both
 
     offices_count = db.Column(db.Integer, nullable=True, comment="Number of offices or locations (including HQ) supporting users")
 
@@ -118,7 +199,7 @@ class Service(db.Model):
     system_last_update = db.Column(db.String(20), nullable=True)
     system_target_uptime = db.Column(db.String(50), nullable=True)
     system_actual_uptime = db.Column(db.String(50), nullable=True)
-    hosting_location = db.Column(db.String(255), nullable=True)  # e.g., Cloud, On-premise, Hybrid
+    hosting_location = db.Column(db.String(255), nullable=True, index=True)  # e.g., Cloud, On-premise, Hybrid
     funding_details = db.Column(db.String(255), nullable=True)  # e.g., Government, Private, Donor-funded
 
     complies_with_standards = db.Column(db.Boolean, default=False)
@@ -134,6 +215,284 @@ class Service(db.Model):
     # Relationship back to entity
     entity = db.relationship('Entity', backref=db.backref('services', lazy=True))
 
+    # Indexed copy of the comma-separated multi-select fields (see ServiceOption)
+    options = db.relationship('ServiceOption', lazy=True, cascade='all, delete-orphan')
+
     def __repr__(self):
         return f"<Service {self.service_name} for Entity ID {self.entity_id}>"
 
+    @validates('interaction_category', 'support_available_via')
+    def sync_options(self, key, value):
+        """Keep the option rows in step with the comma-separated column."""
+        selected = set(v for v in (value or '').split(',') if v)
+        kept = [o for o in self.options if o.field != key or o.value in selected]
+        existing = set(o.value for o in kept if o.field == key)
+        self.options = kept + [ServiceOption(field=key, value=v) for v in sorted(selected - existing)]
+        return value
+
+    @classmethod
+    def entity_page_query(cls, entity_id, after=None, limit=50):
+        """
+        Listed columns of an entity's services after id `after`, keyset-
+        paginated on id (served by the entity_id index). Fetches one extra
+        row to tell whether another page follows.
+        """
+        stmt = db.select(cls.id, cls.service_name, cls.interaction_category, cls.users_total) \
+            .where(cls.entity_id == entity_id).order_by(cls.id).limit(limit + 1)
+        if after:
+            stmt = stmt.where(cls.id > after)
+        return stmt
+
+    @classmethod
+    def page_for_entity(cls, entity_id, after=None, limit=50):
+        """One page of an entity's services: (rows, id to continue after, or None on the last page)."""
+        rows = db.session.execute(cls.entity_page_query(entity_id, after, limit)).all()
+        return rows[:limit], (rows[limit - 1].id if len(rows) > limit else None)
+
+
+class ServiceOption(db.Model):
+    """
+    One selected value of a multi-select service field, e.g.
+    ('interaction_category', 'G2C') or ('support_available_via', 'Call Center').
+    Indexed by (field, value) so filtering by a choice doesn't scan services.
+    """
+    __tablename__ = 'service_options'
+    __table_args__ = (db.Index('ix_service_options_field_value', 'field', 'value', 'service_id'),)
+
+    service_id = db.Column(db.Integer, db.ForeignKey('services.id', ondelete='CASCADE'), primary_key=True)
+    field = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(50), primary_key=True)
+
+    def __repr__(self):
+        return f"<ServiceOption {self.field}={self.value} for Service ID {self.service_id}>"
+
+
+class ServiceTombstone(db.Model):
+    """A deleted service, kept so delta exports can report the deletion."""
+    __tablename__ = 'service_tombstones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    service_id = db.Column(db.Integer, nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ServiceTombstone {self.service_id} deleted {self.deleted_at}>"
+
+
+class SimilaritySignature(db.Model):
+    """MinHash signature of a service's or entity's text (see similarity.py)."""
+    __tablename__ = 'similarity_signatures'
+
+    kind = db.Column(db.String(10), primary_key=True)  # 'service' or 'entity'
+    record_id = db.Column(db.Integer, primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+
+class SimilarityBucket(db.Model):
+    """
+    One LSH band of a signature: records sharing a (band, bucket) are
+    candidate near-duplicates.
+    """
+    __tablename__ = 'similarity_buckets'
+    __table_args__ = (db.Index('ix_similarity_buckets_record', 'kind', 'record_id'),)
+
+    kind = db.Column(db.String(10), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    record_id = db.Column(db.Integer, primary_key=True)
+
+
+def add_to_rows(connection, model, keys, column, rows):
+    """
+    Add each row's `column` to the stored row with the same `keys`, inserting
+    rows that don't exist yet. On SQLite, PostgreSQL and MySQL this is one
+    INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY UPDATE), so two
+    transactions creating the same row can't both try to insert it.
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=keys,
+                                          set_={column: getattr(model, column) + stmt.excluded[column]})
+        connection.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(model).values(rows)
+        connection.execute(stmt.on_duplicate_key_update({column: getattr(model, column) + stmt.inserted[column]}))
+    else:
+        for row in rows:
+            match = [getattr(model, key) == row[key] for key in keys]
+            result = connection.execute(update(model).where(*match)
+                                        .values({column: getattr(model, column) + row[column]}))
+            if result.rowcount == 0:
+                connection.execute(insert(model).values(row))
+
+
+class Counter(db.Model):
+    """Named monotonically increasing counters, e.g. the export data version."""
+    __tablename__ = 'counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get(cls, name):
+        return db.session.execute(select(cls.value).where(cls.name == name)).scalar() or 0
+
+    @classmethod
+    def bump(cls, connection, name):
+        """Increment `name` on `connection`, creating the counter if needed."""
+        add_to_rows(connection, cls, ['name'], 'value', [{'name': name, 'value': 1}])
+
+
+class ExportJob(db.Model):
+    """A background export and the compressed artifact it produced."""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    # Counter('data') value the export was built from
+    data_version = db.Column(db.Integer, nullable=False, index=True)
+    path = db.Column(db.String(255), nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    requested_by = db.Column(db.String(150), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.status} v{self.data_version}>"
+
+
+@event.listens_for(db.session, 'after_flush')
+def bump_data_version(session, flush_context):
+    """
+    Bump the data version whenever exported data (services or entities)
+    changes, and the services version of every entity whose services changed.
+    """
+    changed = [obj for obj in session.new | session.dirty | session.deleted
+               if isinstance(obj, (Service, Entity))
+               and (obj in session.new or obj in session.deleted or session.is_modified(obj))]
+    if not changed:
+        return
+    Counter.bump(session.connection(), 'data')
+
+    entity_ids = set()
+    for obj in changed:
+        if isinstance(obj, Service):
+            entity_ids.update([obj.entity_id, _committed_value(inspect(obj), 'entity_id')])
+    entity_ids.discard(None)
+    if entity_ids:
+        session.connection().execute(update(Entity).where(Entity.id.in_(entity_ids))
+                                     .values(services_version=Entity.services_version + 1))
+
+
+class ServiceStat(db.Model):
+    """
+    Service counts per dimension value, kept up to date on every flush so the
+    admin dashboard never has to scan the services table.
+    """
+    __tablename__ = 'service_stats'
+
+    dimension = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    CHANNELS = [('access_website', 'Website'), ('access_mobile_app', 'Mobile App'),
+                ('access_ussd', 'USSD'), ('access_physical_office', 'Physical Office')]
+
+    @classmethod
+    def keys_for(cls, get):
+        """
+        The (dimension, value) pairs a service counts towards.
+        `get(attribute)` returns the service's value for an attribute.
+        """
+        keys = [('total', 'Services')]
+        categories = [c for c in (get('interaction_category') or '').split(',') if c]
+        keys += [('interaction_category', c) for c in categories or ['Not specified']]
+        for attribute in ('access_mode', 'geographic_reach', 'hosting_location'):
+            keys.append((attribute, get(attribute) or 'Not specified'))
+        keys += [('channel', label) for attribute, label in cls.CHANNELS if get(attribute)]
+        keys.append(('it_system', 'Supported' if get('supported_by_it_system') else 'Not supported'))
+        return keys
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        """Add `deltas` ({(dimension, value): change}) to the counts, in one statement."""
+        rows = [{'dimension': dimension, 'value': value, 'count': delta}
+                for (dimension, value), delta in sorted(deltas.items()) if delta]
+        add_to_rows(connection, cls, ['dimension', 'value'], 'count', rows)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every count from the services table."""
+        columns = ['interaction_category', 'access_mode', 'geographic_reach', 'hosting_location',
+                   'supported_by_it_system'] + [attribute for attribute, _ in cls.CHANNELS]
+        deltas = Tally()
+        rows = db.session.execute(select(*[getattr(Service, c) for c in columns]).execution_options(yield_per=1000))
+        for row in rows:
+            deltas.update(cls.keys_for(row._mapping.get))
+        db.session.execute(cls.__table__.delete())
+        cls.apply(db.session.connection(), deltas)
+        db.session.commit()
+        return deltas['total', 'Services']
+
+    @classmethod
+    def summary(cls):
+        """{dimension: [(value, count), ...]} ordered by count."""
+        summary = {}
+        for stat in cls.query.filter(cls.count > 0).order_by(cls.dimension, cls.count.desc(), cls.value):
+            summary.setdefault(stat.dimension, []).append((stat.value, stat.count))
+        return summary
+
+
+@event.listens_for(db.session, 'before_flush')
+def update_service_stats(session, flush_context, instances):
+    """Apply the count changes of the services about to be inserted, edited or deleted."""
+    deltas = Tally()
+    for obj in session.new:
+        if isinstance(obj, Service):
+            deltas.update(ServiceStat.keys_for(lambda attribute: getattr(obj, attribute)))
+    for obj in session.deleted:
+        if isinstance(obj, Service):
+            state = inspect(obj)
+            deltas.subtract(ServiceStat.keys_for(lambda attribute: _committed_value(state, attribute)))
+    for obj in session.dirty:
+        if isinstance(obj, Service) and session.is_modified(obj):
+            state = inspect(obj)
+            deltas.subtract(ServiceStat.keys_for(lambda attribute: _committed_value(state, attribute)))
+            deltas.update(ServiceStat.keys_for(lambda attribute: getattr(obj, attribute)))
+    if any(deltas.values()):
+        ServiceStat.apply(session.connection(), deltas)
+
+
+@event.listens_for(db.session, 'before_flush')
+def touch_timestamps(session, flush_context, instances):
+    """
+    Stamp updated_at on services and entities whose exported data is about
+    to change, and leave a tombstone for every deleted service.
+    """
+    now = utcnow()
+    for obj in session.dirty:
+        if isinstance(obj, Service) and session.is_modified(obj):
+            obj.updated_at = now
+        elif isinstance(obj, Entity):
+            state = inspect(obj)
+            changed = {attr.key for attr in state.attrs
+                       if attr.key in state.mapper.column_attrs and attr.history.has_changes()}
+            if changed - Entity.UNTRACKED_COLUMNS:
+                obj.updated_at = now
+    for obj in session.deleted:
+        if isinstance(obj, Service):
+            session.add(ServiceTombstone(service_id=obj.id, entity_id=_committed_value(inspect(obj), 'entity_id'),
+                                         deleted_at=now))
+
+
+def _committed_value(state, attribute):
+    """The value as last loaded from the database (loading it if expired)."""
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), attribute)
@@ -0,0 +1,50 @@
+import re
+from datetime import timedelta
+
+from sqlalchemy import select, text
+
+from exports import changed_service_ids, export_query
+from models import db, Entity, Service, ServiceOption, ServiceTombstone, ExportJob, utcnow
+
+
+def hot_queries():
+    """
+    (name, statement, tables allowed to be scanned) for the queries on the
+    request and admin hot paths. Full exports read every service by design,
+    so only their join to entities has to be indexed.
+    """
+    return [
+        ('signed link lookup', select(Entity).where(Entity.slug == 'ministry_of_ict'), []),
+        ('entity services list', Service.entity_page_query(1, after=100), []),
+        ('admin filter: interaction category',
+         select(Service.id).where(Service.id.in_(select(ServiceOption.service_id).where(
+             ServiceOption.field == 'interaction_category', ServiceOption.value == 'G2C'))), []),
+        ('admin filter: access mode', select(Service.id).where(Service.access_mode == 'Both'), []),
+        ('admin filter: geographic reach', select(Service.id).where(Service.geographic_reach == 'Parish'), []),
+        ('admin filter: hosting location', select(Service.id).where(Service.hosting_location == 'Cloud'), []),
+        ('link regeneration', select(Entity.id).where(Entity.link_signed_at < utcnow() - timedelta(days=5)), []),
+        ('export artifact lookup', select(ExportJob).where(ExportJob.data_version == 1), []),
+        ('full export', export_query(), ['services']),
+        ('selected export', export_query(Service.id.in_([1, 2, 3])), []),
+        ('delta export', export_query(Service.id.in_(changed_service_ids(utcnow() - timedelta(days=1), utcnow()))),
+         []),
+        ('delta export deletions', select(ServiceTombstone).where(ServiceTombstone.deleted_at > utcnow()), []),
+    ]
+
+
+# "SCAN services" is a full table scan; "SCAN services USING INDEX ..." is not
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?! USING (COVERING )?INDEX)')
+
+
+def check_query_plans():
+    """
+    Run EXPLAIN QUERY PLAN for every hot query.
+    Returns a list of (name, plan lines, offending tables).
+    """
+    results = []
+    for name, stmt, allowed in hot_queries():
+        compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))]
+        scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m and m.group(1) not in allowed]
+        results.append((name, plan, scans))
+    return results
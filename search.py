@@ -0,0 +1,123 @@
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, and_, bindparam, event, literal, literal_column, or_, select, table, column, text
+
+from models import db, Service
+
+# Free-text service columns in the search index; the name ranks highest
+SEARCH_COLUMNS = ('service_name', 'description', 'process_flow', 'kpi_details', 'standards_details',
+                  'integrated_systems', 'comments')
+# bm25 weight of each column, in SEARCH_COLUMNS order
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0)
+FTS_TABLE = 'services_fts'
+# Words of context around the matched terms in a snippet
+SNIPPET_WORDS = 12
+# Snippet markers, escaped along with the text and then turned into <mark>
+MARK_START, MARK_END = '\x02', '\x03'
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new = ', '.join(f'new.{name}' for name in SEARCH_COLUMNS)
+_old = ', '.join(f'old.{name}' for name in SEARCH_COLUMNS)
+
+# External-content FTS5 index over the services table, kept in step by triggers
+# (https://sqlite.org/fts5.html#external_content_tables). Batch migrations that
+# recreate the services table drop the triggers: run `flask rebuild-search-index`
+# after them.
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({_columns}, content='services', "
+    f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON services BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON services BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {_columns} ON services BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+]
+FTS_DROP = [f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{name}" for name in ('insert', 'delete', 'update')] \
+    + [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+# db.create_all() (tests, benchmarks, fresh installs) gets the index too
+for _statement in FTS_DDL:
+    event.listen(Service.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in FTS_DROP:
+    event.listen(Service.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+fts = table(FTS_TABLE, column('rowid'))
+
+
+def include_name(name, type_, parent_names):
+    """Alembic autogenerate filter: the FTS table and its shadow tables aren't in the models."""
+    return not (type_ == 'table' and name.startswith(FTS_TABLE))
+
+
+def uses_fts():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def words(term):
+    return re.findall(r'\w+', term or '')
+
+
+def match_expression(term):
+    """FTS5 query for free text: every word must match, as a word or a word prefix."""
+    return ' '.join('"{}"*'.format(word) for word in words(term))
+
+
+def matching_services(term):
+    """
+    Selectable of (id, rank) for services matching `term`, lower rank first.
+    Ranked by bm25 on SQLite; other backends fall back to unranked LIKE.
+    """
+    if uses_fts():
+        weights = ', '.join(map(str, SEARCH_WEIGHTS))
+        return select(fts.c.rowid.label('id'), literal_column(f'bm25({FTS_TABLE}, {weights})').label('rank')) \
+            .where(literal_column(FTS_TABLE).op('MATCH')(literal(match_expression(term)))) \
+            .subquery('search_matches')
+
+    columns = [getattr(Service, name) for name in SEARCH_COLUMNS]
+    conditions = [or_(*[c.ilike(f'%{word}%') for c in columns]) for word in words(term)]
+    return select(Service.id, literal(0).label('rank')).where(and_(*conditions)).subquery('search_matches')
+
+
+def _mark(text_):
+    """Escape a snippet and turn its match markers into <mark> tags."""
+    return Markup(str(escape(text_)).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def snippets(term, ids):
+    """{service id: Markup snippet around the matched words} for the given services."""
+    if not ids or not words(term):
+        return {}
+    if uses_fts():
+        stmt = text(f"SELECT rowid, snippet({FTS_TABLE}, -1, :start, :end, '…', :size) FROM {FTS_TABLE} "
+                    f"WHERE {FTS_TABLE} MATCH :match AND rowid IN :ids") \
+            .bindparams(bindparam('ids', expanding=True))
+        rows = db.session.execute(stmt, {'start': MARK_START, 'end': MARK_END, 'size': SNIPPET_WORDS,
+                                         'match': match_expression(term), 'ids': list(ids)})
+        return {service_id: _mark(snippet) for service_id, snippet in rows}
+
+    pattern = re.compile('|'.join(map(re.escape, words(term))), re.I)
+    result = {}
+    rows = db.session.execute(select(Service.id, *[getattr(Service, name) for name in SEARCH_COLUMNS])
+                              .where(Service.id.in_(ids)))
+    for service_id, *values in rows:
+        for value in values:
+            found = pattern.search(value or '')
+            if found:
+                start, end = max(0, found.start() - 60), found.end() + 60
+                excerpt = pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, value[start:end])
+                result[service_id] = _mark(('…' if start else '') + excerpt + ('…' if end < len(value) else ''))
+                break
+    return result
+
+
+def rebuild_search_index():
+    """(Re)create the FTS table and its triggers and reindex every service. Returns the row count."""
+    connection = db.session.connection()
+    for statement in FTS_DROP + FTS_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    db.session.commit()
+    return db.session.scalar(select(db.func.count()).select_from(Service))
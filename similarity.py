@@ -0,0 +1,230 @@
+import hashlib
+import re
+import struct
+from itertools import combinations, groupby
+
+from sqlalchemy import and_, delete, event, func, inspect, insert, or_, select
+
+from models import db, Entity, Service, SimilarityBucket, SimilaritySignature
+
+# MinHash values per signature, and the LSH bands they are cut into. Two
+# records share a bucket in some band with probability 1 - (1 - s**ROWS)**BANDS
+# for a similarity s: 0.99 at 0.7, 0.6 at 0.5, 0.07 at 0.3.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Default similarity (estimated Jaccard of character trigrams) of a near-duplicate
+THRESHOLD = 0.7
+# Longest text hashed per record; the start of a description is enough to tell them apart
+MAX_TEXT_CHARS = 2000
+# Buckets larger than this link each member to the first one only, instead of
+# comparing every pair (e.g. dozens of copies of one boilerplate service)
+MAX_BUCKET_PAIRS = 50
+CHUNK_SIZE = 500
+# Text columns hashed for each kind of record
+KINDS = {'service': (Service, ('service_name', 'description')), 'entity': (Entity, ('name',))}
+
+_SIGNATURE = struct.Struct(f'<{NUM_PERM}I')
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w]+', ' ', (text or '')[:MAX_TEXT_CHARS].lower()).split())
+
+
+def shingles(text):
+    """Character trigrams of the normalized text, padded so short names have some."""
+    text = normalize(text)
+    if not text:
+        return set()
+    text = f' {text} '
+    return {text[i:i + 3].encode('utf-8') for i in range(len(text) - 2)}
+
+
+def signature(text):
+    """MinHash signature of `text` as bytes, or None for blank text."""
+    # One extendable-output hash per shingle gives its value under all NUM_PERM hash functions
+    hashed = [_SIGNATURE.unpack(hashlib.shake_128(shingle).digest(_SIGNATURE.size)) for shingle in shingles(text)]
+    if not hashed:
+        return None
+    return _SIGNATURE.pack(*map(min, zip(*hashed)))
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(x == y for x, y in zip(_SIGNATURE.unpack(a), _SIGNATURE.unpack(b))) / NUM_PERM
+
+
+def band_buckets(sig):
+    """The bucket of each band of a signature, as signed 64-bit integers."""
+    size = ROWS * 4
+    return [int.from_bytes(hashlib.blake2b(sig[band * size:(band + 1) * size], digest_size=8).digest(),
+                           'little', signed=True)
+            for band in range(BANDS)]
+
+
+def record_text(values):
+    return ' '.join(value for value in values if value)
+
+
+def _index(connection, kind, records):
+    """Replace the index entries of `records`, a list of (id, text or None to remove)."""
+    ids = [record_id for record_id, _ in records]
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        connection.execute(delete(SimilarityBucket).where(SimilarityBucket.kind == kind,
+                                                          SimilarityBucket.record_id.in_(chunk)))
+        connection.execute(delete(SimilaritySignature).where(SimilaritySignature.kind == kind,
+                                                             SimilaritySignature.record_id.in_(chunk)))
+    signatures, buckets = [], []
+    for record_id, text in records:
+        sig = signature(text) if text is not None else None
+        if sig is None:
+            continue
+        signatures.append({'kind': kind, 'record_id': record_id, 'signature': sig})
+        buckets.extend({'kind': kind, 'band': band, 'bucket': bucket, 'record_id': record_id}
+                       for band, bucket in enumerate(band_buckets(sig)))
+    if signatures:
+        connection.execute(insert(SimilaritySignature), signatures)
+        connection.execute(insert(SimilarityBucket), buckets)
+
+
+@event.listens_for(db.session, 'after_flush')
+def index_changes(session, flush_context):
+    """Keep the index in step with added, renamed and deleted services and entities."""
+    changes = {kind: [] for kind in KINDS}
+    for kind, (model, columns) in KINDS.items():
+        for obj in session.new | session.dirty:
+            if not isinstance(obj, model):
+                continue
+            state = inspect(obj)
+            if obj in session.new or any(state.attrs[name].history.has_changes() for name in columns):
+                changes[kind].append((obj.id, record_text([getattr(obj, name) for name in columns])))
+        changes[kind].extend((obj.id, None) for obj in session.deleted if isinstance(obj, model))
+    for kind, records in changes.items():
+        if records:
+            _index(session.connection(), kind, records)
+
+
+def rebuild_similarity_index(kinds=tuple(KINDS)):
+    """Reindex every service and entity name. Returns {kind: records indexed}."""
+    connection = db.session.connection()
+    counts = {}
+    for kind in kinds:
+        model, columns = KINDS[kind]
+        connection.execute(delete(SimilarityBucket).where(SimilarityBucket.kind == kind))
+        connection.execute(delete(SimilaritySignature).where(SimilaritySignature.kind == kind))
+        counts[kind], last = 0, 0
+        while True:
+            rows = connection.execute(select(model.id, *[getattr(model, name) for name in columns])
+                                      .where(model.id > last).order_by(model.id).limit(CHUNK_SIZE)).all()
+            if not rows:
+                break
+            _index(connection, kind, [(row[0], record_text(row[1:])) for row in rows])
+            counts[kind] += len(rows)
+            last = rows[-1][0]
+    db.session.commit()
+    return counts
+
+
+def _candidate_pairs(kind):
+    """Pairs of records sharing a bucket in at least one band."""
+    shared = select(SimilarityBucket.band, SimilarityBucket.bucket) \
+        .where(SimilarityBucket.kind == kind) \
+        .group_by(SimilarityBucket.band, SimilarityBucket.bucket) \
+        .having(func.count() > 1).subquery()
+    rows = db.session.execute(
+        select(SimilarityBucket.band, SimilarityBucket.bucket, SimilarityBucket.record_id)
+        .join(shared, and_(SimilarityBucket.band == shared.c.band, SimilarityBucket.bucket == shared.c.bucket))
+        .where(SimilarityBucket.kind == kind)
+        .order_by(SimilarityBucket.band, SimilarityBucket.bucket, SimilarityBucket.record_id))
+    pairs = set()
+    for _, members in groupby(rows, key=lambda row: (row.band, row.bucket)):
+        ids = [row.record_id for row in members]
+        if len(ids) > MAX_BUCKET_PAIRS:
+            pairs.update((ids[0], other) for other in ids[1:])
+        else:
+            pairs.update(combinations(ids, 2))
+    return pairs
+
+
+def _signatures(kind, ids):
+    ids, result = list(ids), {}
+    for start in range(0, len(ids), CHUNK_SIZE):
+        result.update(db.session.execute(
+            select(SimilaritySignature.record_id, SimilaritySignature.signature)
+            .where(SimilaritySignature.kind == kind,
+                   SimilaritySignature.record_id.in_(ids[start:start + CHUNK_SIZE]))).all())
+    return result
+
+
+def labels(kind, ids):
+    """{id: display name}: the service name and its entity, or the entity name."""
+    ids, result = list(ids), {}
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        if kind == 'service':
+            rows = db.session.execute(select(Service.id, Service.service_name, Entity.name)
+                                      .join(Entity, Service.entity_id == Entity.id)
+                                      .where(Service.id.in_(chunk)))
+            result.update((service_id, f'{name} ({entity})') for service_id, name, entity in rows)
+        else:
+            result.update(db.session.execute(select(Entity.id, Entity.name).where(Entity.id.in_(chunk))).all())
+    return result
+
+
+def near_duplicate_clusters(kind, threshold=THRESHOLD):
+    """
+    Groups of services (or entities) whose texts are at least `threshold`
+    similar, found through the LSH buckets instead of comparing every pair.
+    Returns [(lowest similarity linking the group, [(id, label)])], largest
+    groups first.
+    """
+    pairs = _candidate_pairs(kind)
+    signatures = _signatures(kind, {record_id for pair in pairs for record_id in pair})
+    parent, lowest = {}, {}
+
+    def root(record_id):
+        while parent.setdefault(record_id, record_id) != record_id:
+            parent[record_id] = parent[parent[record_id]]
+            record_id = parent[record_id]
+        return record_id
+
+    links = []
+    for a, b in pairs:
+        if a in signatures and b in signatures:
+            score = similarity(signatures[a], signatures[b])
+            if score >= threshold:
+                links.append((a, b, score))
+                parent[root(a)] = root(b)
+    for a, _, score in links:
+        top = root(a)
+        lowest[top] = min(lowest.get(top, 1.0), score)
+
+    groups = {}
+    for record_id in parent:
+        groups.setdefault(root(record_id), []).append(record_id)
+    names = labels(kind, parent)
+    clusters = [(lowest[top], [(record_id, names.get(record_id)) for record_id in sorted(ids)])
+                for top, ids in groups.items() if len(ids) > 1]
+    return sorted(clusters, key=lambda cluster: (-len(cluster[1]), -cluster[0], cluster[1][0][0]))
+
+
+def find_similar(kind, text, threshold=THRESHOLD, exclude=None):
+    """
+    Indexed services (or entities) at least `threshold` similar to `text`,
+    e.g. a new submission or a name about to be registered.
+    Returns [(similarity, id, label)], most similar first.
+    """
+    sig = signature(text)
+    if sig is None:
+        return []
+    candidates = db.session.scalars(
+        select(SimilarityBucket.record_id).distinct()
+        .where(SimilarityBucket.kind == kind,
+               or_(*[and_(SimilarityBucket.band == band, SimilarityBucket.bucket == bucket)
+                     for band, bucket in enumerate(band_buckets(sig))]))).all()
+    scored = [(similarity(sig, other), record_id)
+              for record_id, other in _signatures(kind, set(candidates) - {exclude}).items()]
+    scored = [(score, record_id) for score, record_id in scored if score >= threshold]
+    names = labels(kind, [record_id for _, record_id in scored])
+    return [(score, record_id, names.get(record_id)) for score, record_id in sorted(scored, reverse=True)]
@@ -0,0 +1,313 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from exports import EXPORT_COLUMNS
+from models import db, Entity, Service
+
+# Seconds between background flushes
+FLUSH_INTERVAL = 1.0
+# Submissions group-committed per transaction
+FLUSH_BATCH_SIZE = 500
+# Attempts at inserting a submission that hits a constraint violation other
+# than its own key being stored already
+INSERT_ATTEMPTS = 3
+# Errors meaning a record can never be inserted as queued (e.g. its entity was
+# deleted, or a field no longer exists); other errors, like a lost connection,
+# leave it queued for the next flush
+REJECTED = (IntegrityError, DataError, TypeError, ValueError)
+
+
+class SubmissionQueue:
+    """
+    Durable write-behind queue for service submissions.
+
+    Submissions are appended as JSON lines to `queue.log` and fsynced before
+    the respondent gets a response. A flusher moves them into `services` in
+    batches, one transaction per batch, and then advances the byte offset
+    stored in `queue.offset`. A crash between the commit and the offset
+    write replays the batch; rows whose submission_key is already stored
+    are skipped, so delivery is at-least-once and replay is idempotent.
+    Records that can never be inserted are moved to `dead.log` instead of
+    blocking the queue.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.log_path = os.path.join(directory, 'queue.log')
+        self.offset_path = os.path.join(directory, 'queue.offset')
+        self.lock_path = os.path.join(directory, 'flush.lock')
+        self.dead_path = os.path.join(directory, 'dead.log')
+        self._flusher = None
+        # In-memory view of the unflushed log, so lookups don't rescan it (see _refresh)
+        self._lock = threading.Lock()
+        self._unflushed = OrderedDict()  # key -> (end offset, queued_at), in log order
+        self._read_to = 0
+        self._head = None
+        self._dead = (None, 0)  # (size of dead.log when counted, lines)
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    def append(self, key, entity_id, values):
+        self.append_many([(key, entity_id, values)])
+
+    def append_many(self, submissions):
+        """Append (key, entity id, values) submissions with a single fsync."""
+        queued_at = time.time()
+        line = b''.join(
+            (json.dumps({'key': key, 'entity_id': entity_id, 'values': values, 'queued_at': queued_at},
+                        separators=(',', ':')) + '\n').encode('utf-8')
+            for key, entity_id, values in submissions)
+        with open(self.log_path, 'a+b') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                # Never glue a record onto a line left incomplete by a crash
+                size = log.seek(0, os.SEEK_END)
+                if size:
+                    log.seek(size - 1)
+                    if log.read(1) != b'\n':
+                        line = b'\n' + line
+                log.write(line)
+                log.flush()
+                os.fsync(log.fileno())
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset):
+        tmp = self.offset_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.offset_path)
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _pending(self, offset, limit=None):
+        """[(end offset, record)] for complete lines after `offset`."""
+        records = []
+        try:
+            with open(self.log_path, 'rb') as log:
+                if offset > os.fstat(log.fileno()).st_size:
+                    offset = 0  # the log was truncated under an offset that wasn't reset
+                log.seek(offset)
+                for line in log:
+                    if not line.endswith(b'\n'):
+                        break  # still being written
+                    offset += len(line)
+                    try:
+                        records.append((offset, json.loads(line)))
+                    except ValueError:
+                        continue  # fragment of a write interrupted by a crash
+                    if limit and len(records) == limit:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def flush(self, batch_size=FLUSH_BATCH_SIZE):
+        """
+        Move queued submissions into `services`. Returns the number of rows
+        inserted, or None if another process is already flushing.
+        """
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+
+            inserted = 0
+            while True:
+                offset = self._read_offset()
+                if offset and offset > self._log_size():
+                    # Crashed between truncating the log and resetting the offset (older versions)
+                    offset = 0
+                    self._write_offset(0)
+                batch = self._pending(offset, batch_size)
+                if not batch:
+                    self._compact(offset)
+                    return inserted
+
+                records = [record for _, record in batch]
+                try:
+                    inserted += self._insert(records)
+                except REJECTED:
+                    # Find the records that can never be stored and set them aside
+                    db.session.rollback()
+                    for record in records:
+                        try:
+                            inserted += self._insert([record])
+                        except REJECTED as error:
+                            db.session.rollback()
+                            self._dead_letter(record, error)
+                self._write_offset(batch[-1][0])
+
+    def _insert(self, records):
+        """Insert `records` in one transaction, skipping keys already stored. Returns the rows inserted."""
+        keys = [record['key'] for record in records]
+        stored = set(db.session.execute(
+            db.select(Service.submission_key).where(Service.submission_key.in_(keys))).scalars())
+        inserted = 0
+        for record in records:
+            if record['key'] in stored:
+                continue
+            stored.add(record['key'])
+            db.session.add(Service(entity_id=record['entity_id'], submission_key=record['key'],
+                                   **record['values']))
+            inserted += 1
+        db.session.commit()
+        return inserted
+
+    def _dead_letter(self, record, error):
+        """Append a record that can't be inserted to dead.log, with the reason."""
+        line = json.dumps(dict(record, error=f'{type(error).__name__}: {error}'.splitlines()[0],
+                               failed_at=time.time()), separators=(',', ':')) + '\n'
+        with open(self.dead_path, 'ab') as dead:
+            dead.write(line.encode('utf-8'))
+            dead.flush()
+            os.fsync(dead.fileno())
+
+    def _compact(self, offset):
+        """Truncate the log once everything in it has been flushed."""
+        if not offset:
+            return
+        with open(self.log_path, 'ab') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(self.log_path) == offset:
+                    # Offset first: a crash in between replays the log, which skips stored keys,
+                    # whereas a stale offset over an emptied log would skip new submissions
+                    self._write_offset(0)
+                    log.truncate(0)
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _first_key(self):
+        """Key of the log's first record, which identifies the log between compactions."""
+        try:
+            with open(self.log_path, 'rb') as log:
+                line = log.readline()
+        except FileNotFoundError:
+            return None
+        if not line.endswith(b'\n'):
+            return None
+        try:
+            return json.loads(line)['key']
+        except ValueError:
+            return line
+
+    def _refresh(self):
+        """
+        Bring the in-memory view of unflushed submissions up to date: read
+        only what was appended to the log since the last call (by any
+        process) and drop what has been flushed since. The view is rebuilt
+        from the whole log at startup and after the log is compacted.
+        """
+        with self._lock:
+            head = self._first_key()
+            if head != self._head or self._log_size() < self._read_to:
+                self._unflushed.clear()
+                self._read_to, self._head = 0, head
+            for end, record in self._pending(self._read_to):
+                self._unflushed[record['key']] = (end, record['queued_at'])
+                self._read_to = end
+            flushed = self._read_offset()
+            while self._unflushed:
+                key, (end, _) = next(iter(self._unflushed.items()))
+                if end > flushed:
+                    break
+                del self._unflushed[key]
+
+    def contains(self, key):
+        """Whether `key` is queued but not yet flushed."""
+        self._refresh()
+        return key in self._unflushed
+
+    def pending_keys(self):
+        """Keys of every queued submission not yet flushed."""
+        self._refresh()
+        return set(self._unflushed)
+
+    def dead_letters(self):
+        """Number of submissions set aside in dead.log because they couldn't be inserted."""
+        try:
+            size = os.path.getsize(self.dead_path)
+        except FileNotFoundError:
+            return 0
+        with self._lock:
+            if self._dead[0] != size:
+                with open(self.dead_path, 'rb') as dead:
+                    self._dead = (size, sum(1 for _ in dead))
+            return self._dead[1]
+
+    def stats(self):
+        """Queue depth, the age in seconds of the oldest unflushed submission, and dead letters."""
+        self._refresh()
+        with self._lock:
+            oldest = next(iter(self._unflushed.values()), None)
+            depth = len(self._unflushed)
+        lag = time.time() - oldest[1] if oldest else 0.0
+        return {'depth': depth, 'lag_seconds': round(lag, 3), 'dead_letters': self.dead_letters()}
+
+    def start_flusher(self, app, interval=FLUSH_INTERVAL):
+        """Flush in a background thread of this process (once per process)."""
+        if self._flusher and self._flusher.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    with app.app_context():
+                        self.flush()
+                except Exception:
+                    app.logger.exception("Submission queue flush failed")
+                time.sleep(interval)
+
+        self._flusher = threading.Thread(target=run, name='submission-flusher', daemon=True)
+        self._flusher.start()
+
+
+# Answer columns that make up a service submission
+CONTENT_COLUMNS = [column for _, column, _ in EXPORT_COLUMNS
+                   if column.class_ is Service and column.key != 'id']
+
+
+def _fingerprint(values):
+    """Hash of a submission's answers, ignoring case and whitespace differences."""
+    normalized = [re.sub(r'\s+', ' ', v).strip().lower() if isinstance(v, str) else v for v in values]
+    return hashlib.sha1(json.dumps(normalized, default=str).encode('utf-8')).digest()
+
+
+def find_duplicate_services():
+    """
+    Group services with identical answers within each entity, in one pass
+    over the table (hashing instead of pairwise comparison).
+    Returns [(entity id, entity name, [service ids])] for groups of two or more.
+    """
+    groups = {}
+    stmt = db.select(Service.id, Service.entity_id, *CONTENT_COLUMNS).order_by(Service.id)
+    for row in db.session.execute(stmt.execution_options(yield_per=1000)):
+        groups.setdefault((row[1], _fingerprint(row[2:])), []).append(row[0])
+
+    duplicates = [(entity_id, ids) for (entity_id, _), ids in groups.items() if len(ids) > 1]
+    names = dict(db.session.execute(db.select(Entity.id, Entity.name).where(
+        Entity.id.in_(set(entity_id for entity_id, _ in duplicates)))).all()) if duplicates else {}
+    return [(entity_id, names.get(entity_id), ids) for entity_id, ids in duplicates]
@@ -0,0 +1,26 @@
+import os
+import sys
+
+# The app reads its configuration at import: test against a throwaway in-memory database
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.pop('SUBMISSION_QUEUE', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import pytest
+
+from admin_lists import count_cache
+from app import app
+from models import db
+
+
+@pytest.fixture
+def database():
+    """An empty schema in the in-memory database, inside an app context."""
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+        count_cache._entries.clear()
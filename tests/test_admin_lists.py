@@ -0,0 +1,32 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from admin_lists import LIST_QUERY_BUDGET, check_list_queries
+from app import app, entity_view, service_view
+from models import db, Entity, Service, User
+
+
+@pytest.fixture
+def admin_user(database):
+    """A database with a few pages of entities and services, and an admin to list them."""
+    entities = []
+    for i in range(entity_view.page_size * 3):
+        entity = Entity(name=f'Entity {i}')
+        entity.refresh_slug()
+        entities.append(entity)
+    db.session.add_all(entities)
+    db.session.flush()
+    db.session.add_all(Service(entity_id=entities[i % len(entities)].id, service_name=f'Service {i}',
+                               interaction_category='G2C', access_mode='Online')
+                       for i in range(service_view.page_size * 3))
+    user = User(username='admin', email='admin@example.com', password=generate_password_hash('secret'))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_list_pages_stay_within_query_budget(admin_user):
+    results = check_list_queries(app, admin_user, [entity_view, service_view])
+    assert [endpoint for endpoint, _ in results] == ['entity', 'service']
+    for endpoint, counts in results:
+        assert max(counts.values()) <= LIST_QUERY_BUDGET, (endpoint, counts)
@@ -0,0 +1,58 @@
+import uuid
+
+import pytest
+
+from app import app
+from models import db, Entity, Service
+from submissions import SubmissionQueue
+
+ANSWERS = {'service_name': 'Passports', 'description': 'Issuing passports', 'interaction_category': ['G2C'],
+           'process_flow': 'Apply, pay, collect', 'access_mode': 'Both'}
+
+
+@pytest.fixture
+def link(database, monkeypatch):
+    """Signed link to an entity's services page."""
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    entity = Entity(name='Ministry of Testing')
+    entity.refresh_slug()
+    db.session.add(entity)
+    db.session.flush()
+    entity.sign_link()
+    db.session.commit()
+    return entity.signed_service_link
+
+
+def post_twice(link):
+    """Submit the same form twice; returns the responses and the flashes left after each."""
+    client = app.test_client()
+    data = dict(ANSWERS, submission_key=str(uuid.uuid4()))
+    results = []
+    for _ in range(2):
+        response = client.post(link, data=data)
+        with client.session_transaction() as session:
+            results.append((response, session.pop('_flashes', [])))
+    return results
+
+
+def assert_stored_once(results, link):
+    for response, flashes in results:
+        assert response.status_code == 302
+        assert response.headers['Location'] == link
+        assert flashes == [('success', 'Service added successfully!')]
+    assert Service.query.count() == 1
+
+
+def test_same_submission_key_stores_one_service(link):
+    assert_stored_once(post_twice(link), link)
+
+
+def test_same_submission_key_stores_one_service_when_queued(link, tmp_path, monkeypatch):
+    queue = SubmissionQueue(str(tmp_path / 'submission_queue'))
+    monkeypatch.setattr('app.submission_queue', queue)
+
+    results = post_twice(link)
+    with open(queue.log_path) as log:
+        assert len(log.readlines()) == 1
+    assert queue.flush() == 1
+    assert_stored_once(results, link)
@@ -0,0 +1,88 @@
+import json
+import os
+import uuid
+
+import pytest
+
+from models import db, Entity, Service
+from submissions import SubmissionQueue
+
+
+@pytest.fixture
+def entity(database):
+    entity = Entity(name='Ministry of Testing')
+    entity.refresh_slug()
+    db.session.add(entity)
+    db.session.commit()
+    return entity
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SubmissionQueue(str(tmp_path / 'submission_queue'))
+
+
+def submission(entity, name, **values):
+    return str(uuid.uuid4()), entity.id, dict(service_name=name, **values)
+
+
+def test_replay_after_offset_reset_stores_no_duplicates(entity, queue, monkeypatch):
+    queue.append_many([submission(entity, 'Passports'), submission(entity, 'Permits')])
+
+    # Crash right after compaction resets the offset, before the log is truncated
+    write_offset = queue._write_offset
+
+    def crash_on_reset(offset):
+        write_offset(offset)
+        if offset == 0:
+            raise SystemExit('crashed')
+
+    monkeypatch.setattr(queue, '_write_offset', crash_on_reset)
+    with pytest.raises(SystemExit):
+        queue.flush()
+    monkeypatch.undo()
+    assert os.path.getsize(queue.log_path) > 0, 'the log was truncated before the offset was reset'
+    assert Service.query.count() == 2
+
+    assert queue.flush() == 0
+    assert sorted(s.service_name for s in Service.query) == ['Passports', 'Permits']
+    assert os.path.getsize(queue.log_path) == 0
+
+
+def test_unstorable_record_is_dead_lettered(entity, queue):
+    good, bad, later = (submission(entity, 'Passports'), submission(entity, 'Visas', no_such_field='x'),
+                        submission(entity, 'Permits'))
+    queue.append_many([good, bad, later])
+
+    assert queue.flush() == 2
+    with open(queue.dead_path) as dead:
+        letters = [json.loads(line) for line in dead]
+    assert [letter['key'] for letter in letters] == [bad[0]]
+    assert letters[0]['error'].startswith('TypeError')
+    assert queue.stats()['dead_letters'] == 1
+
+    # The queue keeps moving past it
+    queue.append(*submission(entity, 'Licences'))
+    assert queue.flush() == 1
+    assert sorted(s.service_name for s in Service.query) == ['Licences', 'Passports', 'Permits']
+    assert queue.stats() == {'depth': 0, 'lag_seconds': 0.0, 'dead_letters': 1}
+
+
+def test_contains_and_stats_after_compaction(entity, queue):
+    first, second = submission(entity, 'Passports'), submission(entity, 'Permits')
+    queue.append_many([first, second])
+    assert queue.contains(first[0]) and queue.contains(second[0])
+    assert queue.stats()['depth'] == 2
+
+    queue.flush()
+    assert os.path.getsize(queue.log_path) == 0
+    assert not queue.contains(first[0])
+    assert queue.stats() == {'depth': 0, 'lag_seconds': 0.0, 'dead_letters': 0}
+
+    third = submission(entity, 'Licences')
+    queue.append(*third)
+    assert queue.contains(third[0]) and not queue.contains(first[0])
+    assert queue.stats()['depth'] == 1
+    # Another process's view of the same queue agrees
+    other = SubmissionQueue(queue.directory)
+    assert other.pending_keys() == {third[0]}
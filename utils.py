@@ -1,28 +1,121 @@
 # signed_url_handler.py
 
-from flask import current_app
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+import threading
+import time
+
+from flask import current_app, has_request_context, url_for
 import itsdangerous
+import re
 from werkzeug.exceptions import NotFound
 
+# Signed links are valid for 7 days (in seconds)
+SIGNED_URL_MAX_AGE = 60 * 60 * 24 * 7
+# SIGNED_URL_MAX_AGE = 1 * 60 # 1 minute for testing
+
+def slugify(name):
+    """
+    Normalizes an entity name for link lookups: trimmed, lower-cased, with
+    runs of whitespace/underscores collapsed to a single underscore.
+    Matches the payload format of links signed before slugs existed.
+    """
+    return re.sub(r'[\s_]+', '_', name.strip().lower())
+
+@lru_cache(maxsize=4)
+def _serializer(secret_key):
+    return itsdangerous.URLSafeTimedSerializer(secret_key)
+
 def generate_signed_url(entity_name):
     """
     Generates a signed URL for a given entity ID.
     """
-    serializer = itsdangerous.URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-    return serializer.dumps(entity_name, salt='entity-salt')
+    return _serializer(current_app.config['SECRET_KEY']).dumps(entity_name, salt='entity-salt')
 
-def validate_signed_url(signed_url):
+def service_link(signed_url):
     """
-    Validates the signed URL and retrieves the associated entity ID.
+    Builds the relative link to the service form for a signed token.
+    Works outside a request (CLI commands, background jobs) as well.
+    """
+    if has_request_context():
+        return url_for('add_service', signed_url=signed_url)
+    adapter = current_app.url_map.bind(current_app.config.get('SERVER_NAME') or 'localhost',
+                                       script_name=current_app.config.get('APPLICATION_ROOT', '/'))
+    return adapter.build('add_service', {'signed_url': signed_url})
+
+def load_signed_url(signed_url):
+    """
+    Validates the signed URL and returns the payload together with the
+    unix time at which the link expires.
     If the URL is invalid or expired, raises a NotFound exception.
     """
     try:
-        # Decode the signed URL token
-        serializer = itsdangerous.URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-        # Set expiry time to 7 days (in seconds)
-        expires_in = 60 * 60 * 24 * 7  # 7 days
-        # expires_in = 1 * 60 # 1 minute for testing
-        entity_name = serializer.loads(signed_url, salt='entity-salt', max_age=expires_in)  # Specify salt and max_age for validation
-        return entity_name
+        serializer = _serializer(current_app.config['SECRET_KEY'])
+        entity_name, signed_at = serializer.loads(signed_url, salt='entity-salt', max_age=SIGNED_URL_MAX_AGE,
+                                                  return_timestamp=True)
+        expires_at = (signed_at + timedelta(seconds=SIGNED_URL_MAX_AGE)).timestamp()
+        return entity_name, expires_at
     except (itsdangerous.SignatureExpired, itsdangerous.BadSignature):
         raise NotFound("Invalid or expired signed URL.")
+
+def validate_signed_url(signed_url):
+    """
+    Validates the signed URL and retrieves the associated entity ID.
+    If the URL is invalid or expired, raises a NotFound exception.
+    """
+    entity_name, _ = load_signed_url(signed_url)
+    return entity_name
+
+
+class TokenCache:
+    """
+    Bounded, per-process LRU cache of verified signed tokens -> entity id.
+    Each entry expires together with its token, so a hit never outlives
+    the link's own validity.
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token -> (entity_id, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """Return the cached entity id for `token`, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token, entity_id, expires_at):
+        with self._lock:
+            self._entries[token] = (entity_id, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_entity(self, entity_id):
+        """Drop every cached token that resolves to `entity_id`."""
+        with self._lock:
+            for token in [t for t, (eid, _) in self._entries.items() if eid == entity_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+token_cache = TokenCache()